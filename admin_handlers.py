@@ -1,28 +1,27 @@
 from aiogram import Router, F, Bot
+from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
 import asyncio
+import os
+import tempfile
 from datetime import datetime
+from typing import Optional, Tuple
 
 from database import Database
-from keyboards import build_main_keyboard, build_admin_keyboard
+from keyboards import build_main_keyboard, build_admin_keyboard, build_page_keyboard
 from states import AdminStates
-from config import ADMIN_IDS, DEVELOPER_ID
+from config import EXPORT_GZIP
 from storage import storage
+from matchmaking import Matchmaker
+from middlewares import UserContext, is_admin
+from outbound import Outbox
+from broadcast import Broadcaster, build_broadcast_keyboard, format_progress
+from relay import AlbumBuffer
 
 router = Router()
-db = Database()
 
 support_tickets = {}
-broadcast_messages = {}
-
-async def is_admin(user_id: int) -> bool:
-    if user_id == DEVELOPER_ID:
-        return True
-    user_info = await db.get_user(user_id)
-    if user_info and user_info.get('is_admin'):
-        return True
-    return user_id in ADMIN_IDS
 
 def build_user_management_keyboard(user_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
@@ -42,9 +41,8 @@ def build_user_management_keyboard(user_id: int) -> InlineKeyboardMarkup:
     )
 
 @router.message(F.text == "🛠️ Админ")
-async def handle_admin_main(message: Message, state: FSMContext, bot: Bot):
-    user = message.from_user
-    if user is None or not await is_admin(user.id):
+async def handle_admin_main(message: Message, state: FSMContext, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         await message.answer("❌ Недостаточно прав")
         return
     
@@ -55,8 +53,8 @@ async def handle_admin_main(message: Message, state: FSMContext, bot: Bot):
     await state.set_state(AdminStates.main)
 
 @router.message(AdminStates.main, F.text == "👤 Управление пользователями")
-async def admin_user_management(message: Message, state: FSMContext, bot: Bot):
-    if not await is_admin(message.from_user.id):
+async def admin_user_management(message: Message, state: FSMContext, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         return
     
     await message.answer(
@@ -65,7 +63,7 @@ async def admin_user_management(message: Message, state: FSMContext, bot: Bot):
     await state.set_state(AdminStates.user_management)
 
 @router.message(AdminStates.user_management)
-async def admin_user_manage(message: Message, state: FSMContext, bot: Bot):
+async def admin_user_manage(message: Message, state: FSMContext, bot: Bot, db: Database):
     if not message.text.isdigit():
         await message.answer("❌ Введите корректный ID пользователя (только цифры)")
         return
@@ -85,22 +83,17 @@ async def admin_user_manage(message: Message, state: FSMContext, bot: Bot):
     )
 
 @router.callback_query(F.data.startswith("admin_block:"))
-async def admin_block_user(call: CallbackQuery, bot: Bot):
-    if not await is_admin(call.from_user.id):
+async def admin_block_user(call: CallbackQuery, bot: Bot, db: Database, outbox: Outbox, matchmaker: Matchmaker, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         await call.answer("❌ Недостаточно прав")
         return
         
     user_id = int(call.data.split(":")[1])
     
     await db.set_blocked(user_id, True)
+    matchmaker.forget(user_id)
     
-    try:
-        await bot.send_message(
-            user_id,
-            "🚫 Ваш аккаунт заблокирован администратором\n\nВы больше не можете использовать бота.",
-        )
-    except Exception:
-        pass
+    outbox.send_message(user_id, "🚫 Ваш аккаунт заблокирован администратором\n\nВы больше не можете использовать бота.")
     
     await call.answer("✅ Пользователь заблокирован")
     user_info = await db.get_user(user_id)
@@ -111,8 +104,8 @@ async def admin_block_user(call: CallbackQuery, bot: Bot):
     )
 
 @router.callback_query(F.data.startswith("admin_unblock:"))
-async def admin_unblock_user(call: CallbackQuery, bot: Bot):
-    if not await is_admin(call.from_user.id):
+async def admin_unblock_user(call: CallbackQuery, bot: Bot, db: Database, outbox: Outbox, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         await call.answer("❌ Недостаточно прав")
         return
         
@@ -120,13 +113,7 @@ async def admin_unblock_user(call: CallbackQuery, bot: Bot):
     
     await db.set_blocked(user_id, False)
     
-    try:
-        await bot.send_message(
-            user_id,
-            "✅ Ваш аккаунт разблокирован администратором\n\nТеперь вы снова можете пользоваться чатом!",
-        )
-    except Exception:
-        pass
+    outbox.send_message(user_id, "✅ Ваш аккаунт разблокирован администратором\n\nТеперь вы снова можете пользоваться чатом!")
     
     await call.answer("✅ Пользователь разблокирован")
     user_info = await db.get_user(user_id)
@@ -137,8 +124,8 @@ async def admin_unblock_user(call: CallbackQuery, bot: Bot):
     )
 
 @router.callback_query(F.data.startswith("admin_pair_start:"))
-async def admin_pair_start(call: CallbackQuery, state: FSMContext, bot: Bot):
-    if not await is_admin(call.from_user.id):
+async def admin_pair_start(call: CallbackQuery, state: FSMContext, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         await call.answer("❌ Недостаточно прав")
         return
         
@@ -150,8 +137,8 @@ async def admin_pair_start(call: CallbackQuery, state: FSMContext, bot: Bot):
     await state.set_state(AdminStates.user_management)
 
 @router.callback_query(F.data.startswith("admin_make_admin:"))
-async def admin_make_admin(call: CallbackQuery, bot: Bot):
-    if not await is_admin(call.from_user.id):
+async def admin_make_admin(call: CallbackQuery, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         await call.answer("❌ Недостаточно прав")
         return
         
@@ -168,113 +155,150 @@ async def admin_make_admin(call: CallbackQuery, bot: Bot):
     )
 
 @router.message(AdminStates.main, F.text == "📊 Статистика")
-async def admin_stats(message: Message, bot: Bot):
-    if not await is_admin(message.from_user.id):
+async def admin_stats(message: Message, bot: Bot, db: Database, outbox: Outbox, matchmaker: Matchmaker, albums: AlbumBuffer, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         return
     
-    total_users, searching_users, active_dialogs = await db.stats()
-    
-    blocked_users = await db.get_blocked_users()
+    counters = await db.counters()
     new_today = await db.get_recent_users(1)
-    admins_list = await db.get_admins()
     
     stats_text = (
         "📊 Статистика школьного чата\n\n"
-        f"👥 Всего пользователей: {total_users}\n"
-        f"🔍 В поиске: {searching_users}\n"
-        f"💬 Активных диалогов: {active_dialogs}\n"
-        f"🚫 Заблокированных: {len(blocked_users)}\n"
+        f"👥 Всего пользователей: {counters.get('total', 0)}\n"
+        f"🔍 В поиске: {counters.get('searching', 0)}\n"
+        f"💬 Активных диалогов: {counters.get('in_dialog', 0) // 2}\n"
+        f"🚫 Заблокированных: {counters.get('blocked', 0)}\n"
         f"🆕 Новых за сутки: {new_today}\n"
-        f"👑 Администраторов: {len(admins_list)}"
+        f"👑 Администраторов: {counters.get('admins', 0)}\n\n"
+        f"🗄️ Кэш пользователей: {len(db.cache)} записей, попаданий {db.cache.hits}, промахов {db.cache.misses}\n"
+        f"✍️ Отложенная запись: в очереди {len(db.write_behind)}, пачек {db.write_behind.batches}, "
+        f"последняя {db.write_behind.last_batch_size} оп. за {db.write_behind.last_flush_ms:.1f} мс "
+        f"(макс. {db.write_behind.max_batch_size} оп., {db.write_behind.max_flush_ms:.1f} мс)"
+    )
+    waits = matchmaker.waits
+    stats_text += (
+        f"\n\n⏱️ Ожидание собеседника: p50 {waits.percentile(0.5):.0f} с, p95 {waits.percentile(0.95):.0f} с, "
+        f"макс. {waits.max:.0f} с (подборов: {waits.count}, снято по таймауту: {matchmaker.expired})"
+        f"\n💤 Завершено диалогов по простою: {db.activity.ended} (отслеживается: {len(db.activity)})"
     )
+    outgoing = outbox.stats()
+    stats_text += (
+        f"\n\n📮 Исходящие: в очереди {outgoing['relay']} пересылок, {outgoing['notify']} уведомлений и {outgoing['broadcast']} сообщений рассылки (макс. {outgoing['max_depth']}), "
+        f"отправлено {outgoing['sent']}, повторов {outgoing['retries']}, отброшено {outgoing['dropped']}, ошибок {outgoing['failed']}"
+        f"\n🖼️ Альбомов переслано: {albums.albums} (собирается сейчас: {len(albums)})"
+    )
+    buckets = matchmaker.bucket_stats()
+    if buckets:
+        stats_text += "\n\n🗂️ По корзинам (пол → кого ищет):\n"
+        for bucket in buckets:
+            stats_text += (
+                f"{format_bucket(bucket.key)}: ждут {bucket.waiting}, подборов {bucket.matched}, "
+                f"p50 {bucket.p50:.0f} с, p95 {bucket.p95:.0f} с, макс. {bucket.max_wait:.0f} с, дольше всех сейчас {bucket.oldest_wait:.0f} с\n"
+            )
     await message.answer(stats_text)
 
-@router.message(AdminStates.main, F.text == "👥 Все пользователи")
-async def admin_all_users(message: Message, bot: Bot):
-    if not await is_admin(message.from_user.id):
-        return
-    
-    all_users = await db.get_all_users(5000)
-    
-    if not all_users:
-        await message.answer("❌ Пользователей не найдено")
-        return
-    
-    user_list = "👥 Все пользователи:\n\n"
-    for i, (tg_id, username, reg_date, blocked, is_admin_user) in enumerate(all_users, 1):
+BUCKET_LABELS = {"male": "М", "female": "Ж", None: "?"}
+
+def format_bucket(key: Tuple[Optional[str], Optional[str]]) -> str:
+    gender, seeking_gender = key
+    return f"{BUCKET_LABELS[gender]} → {BUCKET_LABELS[seeking_gender] if seeking_gender else 'любой'}"
+
+PAGE_TITLES = {
+    "all": ("👥 Все пользователи", "total", "❌ Пользователей не найдено"),
+    "searching": ("🔍 Пользователи в поиске", "searching", "❌ Никто не ищет собеседника"),
+    "blocked": ("🚫 Заблокированные пользователи", "blocked", "✅ Нет заблокированных пользователей"),
+}
+
+def format_user_row(kind: str, tg_id: int, username: Optional[str], reg_date: str, blocked: int, is_admin_user: int) -> str:
+    if kind == "all":
         status = "🚫" if blocked else "✅"
         admin_emoji = "👑" if is_admin_user else ""
-        
-        user_list += f"{i}. {status} {admin_emoji} ID: {tg_id}\n"
-        user_list += f"   👤 @{username or 'нет'}\n"
-        user_list += f"   📅 {reg_date[:10]}\n\n"
+        return f"{status} {admin_emoji} ID: {tg_id}\n   👤 @{username or 'нет'}\n   📅 {reg_date[:10]}\n\n"
+    if kind == "searching":
+        return f"ID: {tg_id}\n   👤 @{username or 'нет'}\n\n"
+    return f"ID: {tg_id}\n   👤 @{username or 'нет'}\n   📅 {reg_date[:10]}\n\n"
+
+async def render_users_page(db: Database, kind: str, cursor: Optional[int] = None, backward: bool = False) -> Tuple[Optional[str], Optional[InlineKeyboardMarkup]]:
+    page = await db.list_users_page(kind, cursor, backward)
+    if not page.rows:
+        return None, None
+    title, counter, _ = PAGE_TITLES[kind]
+    counters = await db.counters()
+    text = f"{title} (всего: {counters.get(counter, 0)}):\n\n"
+    for i, (row_id, tg_id, username, reg_date, blocked, is_admin_user) in enumerate(page.rows, 1):
+        text += f"{i}. " + format_user_row(kind, tg_id, username, reg_date, blocked, is_admin_user)
+    keyboard = build_page_keyboard(kind, page.rows[0][0], page.rows[-1][0], page.has_prev, page.has_next)
+    return text, keyboard
+
+async def send_users_page(message: Message, db: Database, kind: str) -> None:
+    text, keyboard = await render_users_page(db, kind)
+    if text is None:
+        await message.answer(PAGE_TITLES[kind][2])
+        return
+    await message.answer(text, reply_markup=keyboard)
+
+@router.message(AdminStates.main, F.text == "👥 Все пользователи")
+async def admin_all_users(message: Message, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
+        return
     
-    await message.answer(user_list)
+    await send_users_page(message, db, "all")
 
 @router.message(AdminStates.main, F.text == "🔍 В поиске")
-async def admin_searching(message: Message, bot: Bot):
-    if not await is_admin(message.from_user.id):
+async def admin_searching(message: Message, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         return
     
-    searching = await db.list_searching(5000)
+    await send_users_page(message, db, "searching")
+
+@router.callback_query(F.data.startswith("admin_page:"))
+async def admin_users_page(call: CallbackQuery, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
+        await call.answer("❌ Недостаточно прав")
+        return
     
-    if not searching:
-        await message.answer("❌ Никто не ищет собеседника")
+    _, kind, direction, cursor = call.data.split(":")
+    if kind not in PAGE_TITLES:
+        await call.answer()
         return
     
-    search_text = "🔍 Пользователи в поиске:\n\n"
-    for i, user_id in enumerate(searching, 1):
-        user_info = await db.get_user(user_id)
-        if user_info:
-            search_text += f"{i}. ID: {user_id}\n"
-            search_text += f"   👤 @{user_info['username'] or 'нет'}\n\n"
+    text, keyboard = await render_users_page(db, kind, int(cursor), backward=direction == "prev")
+    if text is None:
+        await call.answer("❌ Больше записей нет")
+        return
     
-    await message.answer(search_text)
+    await call.message.edit_text(text, reply_markup=keyboard)
+    await call.answer()
 
 @router.message(AdminStates.main, F.text == "💬 Диалоги")
-async def admin_dialogs(message: Message, bot: Bot):
-    if not await is_admin(message.from_user.id):
+async def admin_dialogs(message: Message, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         return
     
-    pairs = await db.list_dialog_pairs(20)
+    pairs = await db.list_dialog_pairs_with_names(20)
     
     if not pairs:
         await message.answer("❌ Активных диалогов нет")
         return
     
     dialogs_text = "💬 Активные диалоги:\n\n"
-    for i, (user1, user2) in enumerate(pairs, 1):
-        user1_info = await db.get_user(user1)
-        user2_info = await db.get_user(user2)
-        
+    for i, (user1, user1_name, user2, user2_name) in enumerate(pairs, 1):
         dialogs_text += f"{i}. 💞 Диалог #{i}\n"
-        dialogs_text += f"   👤 {user1_info['username'] or 'Аноним'} (ID: {user1})\n"
-        dialogs_text += f"   👤 {user2_info['username'] or 'Аноним'} (ID: {user2})\n\n"
+        dialogs_text += f"   👤 {user1_name or 'Аноним'} (ID: {user1})\n"
+        dialogs_text += f"   👤 {user2_name or 'Аноним'} (ID: {user2})\n\n"
     
     await message.answer(dialogs_text)
 
 @router.message(AdminStates.main, F.text == "🚫 Заблокированные")
-async def admin_blocked(message: Message, bot: Bot):
-    if not await is_admin(message.from_user.id):
+async def admin_blocked(message: Message, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         return
     
-    blocked_users = await db.get_blocked_users()
-    
-    if not blocked_users:
-        await message.answer("✅ Нет заблокированных пользователей")
-        return
-    
-    blocked_text = "🚫 Заблокированные пользователи:\n\n"
-    for i, (tg_id, username, reg_date) in enumerate(blocked_users, 1):
-        blocked_text += f"{i}. ID: {tg_id}\n"
-        blocked_text += f"   👤 @{username or 'нет'}\n"
-        blocked_text += f"   📅 {reg_date[:10]}\n\n"
-    
-    await message.answer(blocked_text)
+    await send_users_page(message, db, "blocked")
 
 @router.message(AdminStates.main, F.text == "📝 Жалобы")
-async def admin_reports(message: Message, bot: Bot):
-    if not await is_admin(message.from_user.id):
+async def admin_reports(message: Message, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         return
     
     reports = storage.get_reports()
@@ -286,8 +310,10 @@ async def admin_reports(message: Message, bot: Bot):
     reports_text = "📝 Последние жалобы:\n\n"
     report_count = 0
     
-    for reporter_id, user_reports in list(reports.items())[-10:]:
-        reporter_info = await db.get_user(reporter_id)
+    recent_reports = list(reports.items())[-10:]
+    reporters = await db.get_users(reporter_id for reporter_id, _ in recent_reports)
+    for reporter_id, user_reports in recent_reports:
+        reporter_info = reporters.get(reporter_id)
         if reporter_info:
             reports_text += f"👤 {reporter_info['username'] or 'Аноним'} (ID: {reporter_id})\n"
             
@@ -312,8 +338,8 @@ async def admin_reports(message: Message, bot: Bot):
         await message.answer(reports_text)
 
 @router.message(AdminStates.main, F.text == "👑 Управление админами")
-async def admin_management(message: Message, state: FSMContext, bot: Bot):
-    if not await is_admin(message.from_user.id):
+async def admin_management(message: Message, state: FSMContext, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         return
     
     await message.answer(
@@ -323,20 +349,84 @@ async def admin_management(message: Message, state: FSMContext, bot: Bot):
         "Список админов: /list_admins"
     )
 
+@router.message(Command("repair_dialogs"))
+async def admin_repair_dialogs(message: Message, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
+        return
+    
+    # Трогает только ссылки на собеседников; очередь поиска не перечитываем — свежие постановки ещё в отложенной записи
+    repaired = await db.repair_dialogs()
+    await message.answer(f"🧹 Исправлено несимметричных диалогов: {repaired}")
+
+@router.message(AdminStates.main, F.text == "📤 Экспорт")
+async def admin_export_users(message: Message, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
+        return
+    
+    await message.answer("⏳ Готовлю выгрузку пользователей...")
+    filename = f"users_{datetime.now():%Y%m%d_%H%M%S}.csv" + (".gz" if EXPORT_GZIP else "")
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, filename)
+        exported = await db.export_users_csv(file_path, compress=EXPORT_GZIP)
+        await message.answer_document(FSInputFile(file_path, filename=filename), caption=f"📤 Пользователей в выгрузке: {exported}")
+
+@router.message(AdminStates.main, F.text == "📣 Рассылка")
+async def admin_broadcast(message: Message, state: FSMContext, bot: Bot, broadcaster: Broadcaster, user_ctx: UserContext):
+    if not user_ctx.is_admin:
+        return
+    
+    progress = broadcaster.progress()
+    if broadcaster.running and progress is not None:
+        await message.answer(format_progress(progress), reply_markup=build_broadcast_keyboard())
+        return
+    
+    await message.answer(
+        "📣 Рассылка всем пользователям\n\nОтправьте сообщение для рассылки — текст, фото, видео или файл. "
+        "Оно будет скопировано каждому пользователю как есть.\n\nДля отмены нажмите «🔙 В главное меню»"
+    )
+    await state.set_state(AdminStates.broadcast)
+
+@router.message(AdminStates.broadcast, F.text == "🔙 В главное меню")
+async def admin_broadcast_cancel(message: Message, state: FSMContext, bot: Bot):
+    await message.answer("🎛️ Админ-панель\n\nВыберите раздел:", reply_markup=build_admin_keyboard())
+    await state.set_state(AdminStates.main)
+
+@router.message(AdminStates.broadcast)
+async def admin_broadcast_start(message: Message, state: FSMContext, bot: Bot, broadcaster: Broadcaster, user_ctx: UserContext):
+    if not user_ctx.is_admin:
+        return
+    
+    await state.set_state(AdminStates.main)
+    progress = await message.answer("📣 Запускаю рассылку...", reply_markup=build_broadcast_keyboard())
+    broadcast = await broadcaster.launch(user_ctx.tg_id, message.chat.id, message.message_id, progress.chat.id, progress.message_id)
+    if broadcast is None:
+        await progress.edit_text("❌ Уже идёт другая рассылка")
+        return
+    await progress.edit_text(f"📣 Рассылка #{broadcast.id} запущена: получателей ~{broadcast.total}", reply_markup=build_broadcast_keyboard())
+
+@router.callback_query(F.data == "broadcast_stop")
+async def admin_broadcast_stop(call: CallbackQuery, bot: Bot, broadcaster: Broadcaster, user_ctx: UserContext):
+    if not user_ctx.is_admin:
+        await call.answer("❌ Недостаточно прав")
+        return
+    
+    if broadcaster.cancel():
+        await call.answer("⏹️ Рассылка остановится после текущей страницы")
+    else:
+        await call.answer("ℹ️ Рассылка уже завершена")
+
 @router.message(AdminStates.main, F.text == "🔙 В главное меню")
-async def admin_back_to_main_menu(message: Message, state: FSMContext, bot: Bot):
-    if not await is_admin(message.from_user.id):
+async def admin_back_to_main_menu(message: Message, state: FSMContext, bot: Bot, db: Database, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         return
     
-    user_info = await db.get_user(message.from_user.id)
-    is_admin_user = user_info and (user_info.get('is_admin') or message.from_user.id in ADMIN_IDS)
-    await message.answer("🔙 Возвращаемся в главное меню", reply_markup=build_main_keyboard(is_admin_user))
+    await message.answer("🔙 Возвращаемся в главное меню", reply_markup=build_main_keyboard(user_ctx.is_admin))
     await state.clear()
 
 # Добавляем обработчик для соединения пользователей
 @router.message(AdminStates.user_management)
-async def admin_pair_users(message: Message, state: FSMContext, bot: Bot):
-    if not await is_admin(message.from_user.id):
+async def admin_pair_users(message: Message, state: FSMContext, bot: Bot, db: Database, outbox: Outbox, matchmaker: Matchmaker, user_ctx: UserContext):
+    if not user_ctx.is_admin:
         return
         
     if not message.text.isdigit():
@@ -353,22 +443,24 @@ async def admin_pair_users(message: Message, state: FSMContext, bot: Bot):
         return
     
     # Соединяем пользователей
-    await db.force_pair(user1_id, user2_id)
+    displaced = await db.force_pair(user1_id, user2_id)
+    if displaced is None:
+        await message.answer("❌ Пользователь не найден")
+        await state.set_state(AdminStates.main)
+        return
+    matchmaker.forget(user1_id)
+    matchmaker.forget(user2_id)
+    
+    for former_partner in displaced:
+        is_admin_former = await is_admin(db, former_partner)
+        outbox.send_message(former_partner, "💔 Собеседник завершил диалог", reply_markup=build_main_keyboard(is_admin_former))
     
     # Уведомляем пользователей
-    try:
-        user1_info = await db.get_user(user1_id)
-        is_admin_user1 = await is_admin(user1_id)
-        await bot.send_message(user1_id, "🔗 Администратор соединил вас с собеседником!", reply_markup=build_main_keyboard(is_admin_user1))
-    except Exception:
-        pass
-    
-    try:
-        user2_info = await db.get_user(user2_id)
-        is_admin_user2 = await is_admin(user2_id)
-        await bot.send_message(user2_id, "🔗 Администратор соединил вас с собеседником!", reply_markup=build_main_keyboard(is_admin_user2))
-    except Exception:
-        pass
+    is_admin_user1 = await is_admin(db, user1_id)
+    outbox.send_message(user1_id, "🔗 Администратор соединил вас с собеседником!", reply_markup=build_main_keyboard(is_admin_user1))
+    
+    is_admin_user2 = await is_admin(db, user2_id)
+    outbox.send_message(user2_id, "🔗 Администратор соединил вас с собеседником!", reply_markup=build_main_keyboard(is_admin_user2))
     
     await message.answer(f"✅ Пользователи {user1_id} и {user2_id} соединены!")
     await state.set_state(AdminStates.main)
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""Оценка кандидатов при подборе: векторный пул против поштучного перебора.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.interest_matching --waiting 10000 100000
+
+Для каждого размера пула ожидающие получают случайные возраст, репутацию и
+интересы из общего словаря (популярность по закону Ципфа, как в живых
+анкетах). Словарь по умолчанию больше MASK_BITS, так что хвост редких
+интересов проходит через досчёт по спискам слотов. Затем измеряется время
+выбора лучшего собеседника для случайных запросов с одними и теми же весами:
+
+* scan — как старый матчер в db.py, но по всему пулу: разбор строки
+  интересов каждого кандидата, пересечение множеств и оценка в цикле Python;
+* vector — CandidatePool из scoring.py: один векторный проход по массивам
+  признаков (битовые маски интересов, возраст, репутация, время ожидания).
+
+База данных не используется: сравнивается только сам подбор.
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from database import normalize_interests
+from scoring import REPUTATION_SCALE, CandidatePool, InterestVocabulary, ScoringWeights
+
+Profile = Tuple[int, int, str, float]
+Query = Tuple[int, int, Tuple[str, ...]]
+
+
+def _vocabulary(size: int) -> Tuple[List[str], List[float]]:
+    words = [f"interest{i}" for i in range(size)]
+    weights = [1.0 / (rank + 1) for rank in range(size)]
+    return words, weights
+
+
+def _interests(rng: random.Random, words: List[str], weights: List[float]) -> Tuple[str, ...]:
+    return normalize_interests(", ".join(rng.choices(words, weights, k=rng.randint(1, 8))))
+
+
+def _scan(waiting: Dict[int, Profile], weights: ScoringWeights, now: float) -> Callable[[Query], Optional[int]]:
+    def best(query: Query) -> Optional[int]:
+        tg_id, age, interests = query
+        wanted = set(interests)
+        best_id, best_score = None, float("-inf")
+        for cand_id, (cand_age, reputation, raw, since) in waiting.items():
+            if cand_id == tg_id:
+                continue
+            score = weights.interests * len(wanted & set(normalize_interests(raw)))
+            score += weights.reputation * max(-1.0, min(1.0, reputation / REPUTATION_SCALE))
+            score += weights.wait * (now - since)
+            score -= weights.age * abs(cand_age - age)
+            if score > best_score:
+                best_id, best_score = cand_id, score
+        return best_id
+    return best
+
+
+def _vector(waiting: Dict[int, Profile], weights: ScoringWeights, now: float) -> Callable[[Query], Optional[int]]:
+    vocabulary = InterestVocabulary()
+    pool = CandidatePool()
+    for tg_id, (age, reputation, raw, since) in waiting.items():
+        pool.add(tg_id, vocabulary.features(age, normalize_interests(raw), reputation), since)
+
+    def best(query: Query) -> Optional[int]:
+        tg_id, age, interests = query
+        match = pool.best(tg_id, vocabulary.features(age, interests, 0), weights, now)
+        return match[0] if match else None
+    return best
+
+
+def _measure(best: Callable[[Query], Optional[int]], queries: Sequence[Query]) -> List[float]:
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        best(query)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def run(size: int, args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    words, weights = _vocabulary(args.vocabulary)
+    now = time.monotonic()
+    waiting = {
+        tg_id: (rng.randint(12, 30), rng.randint(-15, 15), ",".join(_interests(rng, words, weights)), now - rng.uniform(0, 300))
+        for tg_id in range(size)
+    }
+    queries = [(size + i, rng.randint(12, 30), _interests(rng, words, weights)) for i in range(args.queries)]
+    scoring = ScoringWeights()
+
+    for name, build in (("scan", _scan), ("vector", _vector)):
+        started = time.perf_counter()
+        best = build(waiting, scoring, now)
+        build_ms = (time.perf_counter() - started) * 1000
+        # Перебор на больших пулах слишком медленный, чтобы гонять все запросы
+        samples = _measure(best, queries[:args.scan_queries] if name == "scan" else queries)
+        ms = 1000.0
+        print(
+            f"{size:>7} {name:>6}: build={build_ms:8.1f}ms queries={len(samples):>5} "
+            f"p50={_percentile(samples, 0.50) * ms:.3f}ms "
+            f"p95={_percentile(samples, 0.95) * ms:.3f}ms "
+            f"mean={statistics.fmean(samples) * ms:.3f}ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--waiting", type=int, nargs="+", default=[10000, 100000])
+    # Больше MASK_BITS: хвост словаря не получает бит в маске и досчитывается по спискам слотов
+    parser.add_argument("--vocabulary", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--scan-queries", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for size in args.waiting:
+        run(size, args)
+
+
+if __name__ == "__main__":
+    main()
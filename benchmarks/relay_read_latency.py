@@ -0,0 +1,104 @@
+"""Задержка чтения на пути пересылки во время «шторма» поисковых записей.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.relay_read_latency --users 20000 --seconds 5
+
+Для каждого профиля хранилища создаётся временная БД, после чего
+параллельно крутятся писатели (UPDATE in_search, как при массовом нажатии
+«Поиск») и читатели через пул соединений на чтение (get_user — get_partner
+и проверки флагов обслуживаются из памяти, а при промахе кэша идут тем же путём). Печатаются
+перцентили задержки чтения и число выполненных записей. Записи идут
+мимо буфера отложенной записи, чтобы каждая давала свой commit.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from config import DB_PRAGMAS
+from database import Database
+
+PROFILES: Dict[str, Dict[str, object]] = {
+    # Настройки SQLite по умолчанию (журнал отката, полный fsync)
+    "rollback": {"journal_mode": "DELETE", "synchronous": "FULL", "busy_timeout": 5000},
+    "tuned": DB_PRAGMAS,
+}
+
+
+async def _seed(db: Database, users: int) -> None:
+    async with db.writer() as conn:
+        await conn.executemany(
+            "INSERT INTO users (tg_id, username, partner_tg_id) VALUES (?, ?, ?)",
+            ((i, f"user{i}", i ^ 1) for i in range(users)),
+        )
+
+
+async def _write_storm(db: Database, users: int, deadline: float, counter: List[int]) -> None:
+    # Каждая запись — отдельная транзакция, как без буфера отложенной записи
+    while time.perf_counter() < deadline:
+        async with db.writer() as conn:
+            await conn.execute(
+                "UPDATE users SET in_search = ? WHERE tg_id = ?",
+                (1 if random.random() < 0.5 else 0, random.randrange(users)),
+            )
+        counter[0] += 1
+
+
+async def _relay_reads(db: Database, users: int, deadline: float, samples: List[float]) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await db.get_user(random.randrange(users))
+        samples.append(time.perf_counter() - started)
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run_profile(name: str, args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"), readers=args.readers, pragmas=PROFILES[name])
+        await db.init()
+        await _seed(db, args.users)
+
+        deadline = time.perf_counter() + args.seconds
+        writes = [0]
+        samples: List[float] = []
+        await asyncio.gather(
+            *(_write_storm(db, args.users, deadline, writes) for _ in range(args.writers)),
+            *(_relay_reads(db, args.users, deadline, samples) for _ in range(args.relays)),
+        )
+        await db.close()
+
+    samples.sort()
+    ms = 1000.0
+    print(
+        f"{name:>9}: reads={len(samples):>7} writes={writes[0]:>6} "
+        f"p50={_percentile(samples, 0.50) * ms:.3f}ms "
+        f"p95={_percentile(samples, 0.95) * ms:.3f}ms "
+        f"p99={_percentile(samples, 0.99) * ms:.3f}ms "
+        f"max={samples[-1] * ms:.3f}ms mean={statistics.fmean(samples) * ms:.3f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--relays", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=3)
+    parser.add_argument("--profile", choices=sorted(PROFILES), action="append")
+    args = parser.parse_args()
+
+    for name in args.profile or ["rollback", "tuned"]:
+        await run_profile(name, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,203 @@
+import asyncio
+from typing import List, NamedTuple, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.methods import CopyMessage, EditMessageText
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config import BROADCAST_PAGE_SIZE, BROADCAST_PROGRESS_INTERVAL
+from database import Broadcast, Database
+from outbound import PRIORITY_BROADCAST, PRIORITY_NOTIFY, Outbox
+
+STATUS_LABELS = {
+    "running": "выполняется",
+    "done": "завершена",
+    "cancelled": "остановлена",
+}
+
+
+class BroadcastProgress(NamedTuple):
+    broadcast_id: int
+    status: str
+    total: int
+    sent: int
+    failed: int
+    unreachable: int
+    rate: float
+    eta: Optional[float]
+
+
+def is_unreachable(error: BaseException) -> bool:
+    # Бот заблокирован, аккаунт удалён или чат недоступен — писать туда дальше бессмысленно
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    return isinstance(error, TelegramBadRequest) and "chat not found" in error.message.lower()
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def format_progress(progress: BroadcastProgress) -> str:
+    done = progress.sent + progress.failed + progress.unreachable
+    percent = min(100, done * 100 // progress.total) if progress.total else 100
+    text = (
+        f"📣 Рассылка #{progress.broadcast_id}: {STATUS_LABELS.get(progress.status, progress.status)}\n\n"
+        f"✅ Доставлено: {progress.sent}\n"
+        f"⚠️ Ошибок: {progress.failed}\n"
+        f"🚷 Заблокировали бота: {progress.unreachable}\n"
+        f"📈 Обработано: {done} из ~{progress.total} ({percent}%)\n"
+        f"⚡ Скорость: {progress.rate:.1f} сообщ./с"
+    )
+    if progress.status == "running" and progress.eta is not None:
+        text += f"\n⏳ Осталось примерно: {format_duration(progress.eta)}"
+    return text
+
+
+def build_broadcast_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="⏹️ Остановить рассылку", callback_data="broadcast_stop")]])
+
+
+class Broadcaster:
+    # Рассылка идёт страницами получателей по возрастанию tg_id. Страница целиком ставится в исходящую очередь
+    # (она и держит скорость в лимитах Telegram), после неё курсор и счётчики сохраняются в базу.
+    # После падения рассылка продолжается с последней сохранённой страницы: повторно может уйти не больше одной страницы
+    def __init__(self, outbox: Outbox, db: Database, page_size: int = BROADCAST_PAGE_SIZE, progress_interval: float = BROADCAST_PROGRESS_INTERVAL) -> None:
+        self.outbox = outbox
+        self.db = db
+        self.page_size = page_size
+        self.progress_interval = progress_interval
+        self._current: Optional[Broadcast] = None
+        self._counts: List[int] = [0, 0, 0]
+        self._started = 0.0
+        self._processed = 0
+        self._cancelled = False
+        self._launching = False
+        self._reported: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def resume(self) -> None:
+        # Рассылки, прерванные перезапуском, остались в статусе running
+        if not self.running and await self.db.list_running_broadcasts():
+            self._task = asyncio.create_task(self._run())
+
+    async def launch(self, created_by: int, from_chat_id: int, message_id: int, progress_chat_id: int, progress_message_id: int) -> Optional[Broadcast]:
+        # Флаг ставится до первого await: иначе два одновременных запуска оба пройдут проверку
+        if self.running or self._launching:
+            return None
+        self._launching = True
+        try:
+            broadcast = await self.db.create_broadcast(created_by, from_chat_id, message_id, progress_chat_id, progress_message_id)
+        finally:
+            self._launching = False
+        self._task = asyncio.create_task(self._run())
+        return broadcast
+
+    def cancel(self) -> bool:
+        if not self.running:
+            return False
+        self._cancelled = True
+        return True
+
+    async def stop(self) -> None:
+        # Остановка бота: рассылка остаётся running и продолжится при следующем запуске
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def progress(self) -> Optional[BroadcastProgress]:
+        broadcast = self._current
+        if broadcast is None:
+            return None
+        elapsed = asyncio.get_running_loop().time() - self._started
+        rate = self._processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, broadcast.total - sum(self._counts))
+        return BroadcastProgress(
+            broadcast.id, broadcast.status, broadcast.total, *self._counts,
+            rate=rate, eta=remaining / rate if rate > 0 else None,
+        )
+
+    async def _run(self) -> None:
+        while not self._cancelled:
+            pending = await self.db.list_running_broadcasts()
+            if not pending:
+                break
+            await self._deliver(pending[0])
+        self._cancelled = False
+
+    async def _deliver(self, broadcast: Broadcast) -> None:
+        loop = asyncio.get_running_loop()
+        self._current = broadcast
+        self._counts = [broadcast.sent, broadcast.failed, broadcast.unreachable]
+        self._started = loop.time()
+        self._processed = 0
+        self._reported = None
+        cursor = broadcast.cursor
+        reported = loop.time()
+        try:
+            while not self._cancelled:
+                page = await self.db.broadcast_recipients(cursor, self.page_size)
+                if not page:
+                    break
+                results = await asyncio.gather(
+                    *(
+                        self.outbox.call(CopyMessage(chat_id=tg_id, from_chat_id=broadcast.from_chat_id, message_id=broadcast.message_id), PRIORITY_BROADCAST)
+                        for tg_id in page
+                    ),
+                    return_exceptions=True,
+                )
+                sent, failed, unreachable = 0, 0, []
+                for tg_id, result in zip(page, results):
+                    if not isinstance(result, BaseException):
+                        sent += 1
+                    elif is_unreachable(result):
+                        unreachable.append(tg_id)
+                    else:
+                        failed += 1
+                cursor = page[-1]
+                await self.db.checkpoint_broadcast(broadcast.id, cursor, sent, failed, unreachable)
+                self._counts[0] += sent
+                self._counts[1] += failed
+                self._counts[2] += len(unreachable)
+                self._processed += len(page)
+                if loop.time() - reported >= self.progress_interval:
+                    self._report(broadcast, running=True)
+                    reported = loop.time()
+        except Exception as e:
+            # Курсор сохранён: рассылка продолжится со следующего запуска
+            print(f"❌ Ошибка рассылки #{broadcast.id}: {e}")
+            self._cancelled = True
+            return
+        status = "cancelled" if self._cancelled else "done"
+        await self.db.finish_broadcast(broadcast.id, status)
+        self._current = broadcast._replace(status=status)
+        self._report(self._current, running=False)
+
+    def _report(self, broadcast: Broadcast, running: bool) -> None:
+        progress = self.progress()
+        if progress is None or broadcast.progress_chat_id is None:
+            return
+        # Telegram отвечает ошибкой «message is not modified» на правку без изменений
+        text = format_progress(progress)
+        if text == self._reported:
+            return
+        self._reported = text
+        self.outbox.send(
+            EditMessageText(
+                chat_id=broadcast.progress_chat_id,
+                message_id=broadcast.progress_message_id,
+                text=text,
+                reply_markup=build_broadcast_keyboard() if running else None,
+            ),
+            PRIORITY_NOTIFY,
+        )
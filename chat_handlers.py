@@ -1,92 +1,87 @@
 from aiogram import Router, F, Bot
-from aiogram.filters import Command
+from aiogram.filters import Command, StateFilter
+from aiogram.methods import CopyMessage, SendMediaGroup
 from aiogram.types import Message
+from typing import List
 from database import Database
+from matchmaking import Matchmaker
 from keyboards import build_main_keyboard, build_reactions_keyboard
-from config import ADMIN_IDS, DEVELOPER_ID
+from middlewares import UserContext, is_admin
+from outbound import Outbox
+from relay import AlbumBuffer, album_media
+from states import AdminStates, ProfileStates
 
 router = Router()
-db = Database()
 
-async def is_admin(user_id: int) -> bool:
-    if user_id == DEVELOPER_ID or user_id in ADMIN_IDS:
-        return True
-    user_info = await db.get_user(user_id)
-    return user_info and user_info.get('is_admin')
+# Пересылка собеседнику — вне состояний и в меню-состояниях, где реагируют только на кнопки.
+# В состояниях ввода (рассылка, поиск пользователя, жалоба и т.п.) сообщение предназначено их обработчику
+RELAY_STATES = StateFilter(None, ProfileStates.settings, AdminStates.main)
 
-async def end_dialog_and_notify(bot: Bot, you_id: int) -> int:
+async def end_dialog_and_notify(outbox: Outbox, db: Database, you_id: int, notice: str = "💔 Собеседник завершил диалог") -> int:
     partner = await db.end_dialog_for(you_id)
     if partner is not None:
-        try:
-            is_admin_user = await is_admin(partner)
-            await bot.send_message(partner, "💔 Собеседник завершил диалог", reply_markup=build_main_keyboard(is_admin_user))
-            
-            # Отправляем кнопки оценки после завершения диалога
-            await bot.send_message(
-                partner,
-                "💭 Если хотите, оставьте мнение о вашем собеседнике. Это поможет находить вам подходящих собеседников:",
-                reply_markup=build_reactions_keyboard()
-            )
-        except Exception:
-            pass
+        is_admin_user = await is_admin(db, partner)
+        outbox.send_message(partner, notice, reply_markup=build_main_keyboard(is_admin_user))
+        
+        # Отправляем кнопки оценки после завершения диалога
+        outbox.send_message(
+            partner,
+            "💭 Если хотите, оставьте мнение о вашем собеседнике. Это поможет находить вам подходящих собеседников:",
+            reply_markup=build_reactions_keyboard(you_id)
+        )
     return partner
 
 @router.message(F.text == "🔎 Поиск")
 @router.message(Command("search"))
-async def handle_search(message: Message, bot: Bot):
+async def handle_search(message: Message, bot: Bot, db: Database, outbox: Outbox, matchmaker: Matchmaker, user_ctx: UserContext):
     user = message.from_user
     if user is None:
         return
     
     await db.ensure_user(user.id, user.username)
     
-    if await db.is_blocked(user.id):
-        is_admin_user = await is_admin(user.id)
-        await message.answer("🚫 Ваш аккаунт заблокирован администратором", reply_markup=build_main_keyboard(is_admin_user))
+    if user_ctx.blocked:
+        await message.answer("🚫 Ваш аккаунт заблокирован администратором", reply_markup=build_main_keyboard(user_ctx.is_admin))
         return
     
-    # Убираем проверку номера телефона
-    await db.set_in_search(user.id, True)
-    partner_id = await db.find_match(user.id)
+    if user_ctx.partner is not None:
+        await message.answer("💬 У вас уже есть собеседник\n\nНажмите «⏭️ Следующий» чтобы сменить его", reply_markup=build_main_keyboard(user_ctx.is_admin))
+        return
+    
+    partner_id = await matchmaker.search(user.id)
     
     if partner_id is None:
-        is_admin_user = await is_admin(user.id)
-        await message.answer("🔍 Ищу собеседника... Ожидайте ⏳", reply_markup=build_main_keyboard(is_admin_user))
+        await message.answer("🔍 Ищу собеседника... Ожидайте ⏳", reply_markup=build_main_keyboard(user_ctx.is_admin))
         return
     
-    is_admin_user = await is_admin(user.id)
-    await message.answer("✅ Собеседник найден!\n\n💬 Можете начинать общение!", reply_markup=build_main_keyboard(is_admin_user))
+    await message.answer("✅ Собеседник найден!\n\n💬 Можете начинать общение!", reply_markup=build_main_keyboard(user_ctx.is_admin))
     
-    try:
-        partner_admin_status = await is_admin(partner_id)
-        await bot.send_message(partner_id, "✅ Собеседник найден!\n\n💬 Можете начинать общение!", reply_markup=build_main_keyboard(partner_admin_status))
-    except Exception:
-        pass
+    partner_admin_status = await is_admin(db, partner_id)
+    outbox.send_message(partner_id, "✅ Собеседник найден!\n\n💬 Можете начинать общение!", reply_markup=build_main_keyboard(partner_admin_status))
 
 
 @router.message(F.text == "🛑 Стоп")
 @router.message(Command("stop"))
-async def handle_stop(message: Message, bot: Bot):
+async def handle_stop(message: Message, bot: Bot, db: Database, outbox: Outbox, matchmaker: Matchmaker, user_ctx: UserContext):
     user = message.from_user
     if user is None:
         return
-    partner_id = await end_dialog_and_notify(bot, user.id)
-    await db.set_in_search(user.id, False)
-    is_admin_user = await is_admin(user.id)
+    partner_id = await end_dialog_and_notify(outbox, db, user.id)
+    await matchmaker.cancel(user.id)
     if partner_id:
-        await message.answer("💔 Диалог завершён\n\nНажмите «🔎 Поиск» чтобы найти нового собеседника", reply_markup=build_main_keyboard(is_admin_user))
+        await message.answer("💔 Диалог завершён\n\nНажмите «🔎 Поиск» чтобы найти нового собеседника", reply_markup=build_main_keyboard(user_ctx.is_admin))
 
         await message.answer(
 
             "💭 Если хотите, оставьте мнение о вашем собеседнике. Это поможет находить вам подходящих собеседников:",
 
-            reply_markup=build_reactions_keyboard()
+            reply_markup=build_reactions_keyboard(partner_id)
 
         )
 
     else:
 
-        await message.answer("ℹ️ У вас нет активного диалога", reply_markup=build_main_keyboard(is_admin_user))
+        await message.answer("ℹ️ У вас нет активного диалога", reply_markup=build_main_keyboard(user_ctx.is_admin))
 
 
 
@@ -94,7 +89,7 @@ async def handle_stop(message: Message, bot: Bot):
 
 @router.message(Command("next"))
 
-async def handle_next(message: Message, bot: Bot):
+async def handle_next(message: Message, bot: Bot, db: Database, outbox: Outbox, matchmaker: Matchmaker, user_ctx: UserContext):
 
     user = message.from_user
 
@@ -104,7 +99,7 @@ async def handle_next(message: Message, bot: Bot):
 
     
 
-    partner_id = await end_dialog_and_notify(bot, user.id)
+    partner_id = await end_dialog_and_notify(outbox, db, user.id)
 
     
 
@@ -116,41 +111,31 @@ async def handle_next(message: Message, bot: Bot):
 
             "💭 Если хотите, оставьте мнение о вашем собеседнике. Это поможет находить вам подходящих собеседников:",
 
-            reply_markup=build_reactions_keyboard()
+            reply_markup=build_reactions_keyboard(partner_id)
 
         )
 
     
 
-    await db.set_in_search(user.id, True)
-
-    new_partner_id = await db.find_match(user.id)
+    new_partner_id = await matchmaker.search(user.id)
 
     
 
-    is_admin_user = await is_admin(user.id)
-
     if new_partner_id is None:
 
-        await message.answer("🔍 Ищу нового собеседника... ⏳", reply_markup=build_main_keyboard(is_admin_user))
+        await message.answer("🔍 Ищу нового собеседника... ⏳", reply_markup=build_main_keyboard(user_ctx.is_admin))
 
         return
 
     
 
-    await message.answer("🔄 Новый собеседник найден!\n\n💬 Можете начинать общение!", reply_markup=build_main_keyboard(is_admin_user))
+    await message.answer("🔄 Новый собеседник найден!\n\n💬 Можете начинать общение!", reply_markup=build_main_keyboard(user_ctx.is_admin))
 
     
 
-    try:
+    partner_admin_status = await is_admin(db, new_partner_id)
 
-        partner_admin_status = await is_admin(new_partner_id)
-
-        await bot.send_message(new_partner_id, "🔄 Новый собеседник найден!\n\n💬 Можете начинать общение!", reply_markup=build_main_keyboard(partner_admin_status))
-
-    except Exception:
-
-        pass
+    outbox.send_message(new_partner_id, "🔄 Новый собеседник найден!\n\n💬 Можете начинать общение!", reply_markup=build_main_keyboard(partner_admin_status))
 
 
 
@@ -164,11 +149,11 @@ def is_not_command(text: str) -> bool:
 
         "📊 Статистика", "👥 Все пользователи", "🔍 В поиске", 
 
-        "💬 Диалоги", "🚫 Заблокированные", "📝 Жалобы",
+        "💬 Диалоги", "🚫 Заблокированные", "📝 Жалобы", "📤 Экспорт", "📣 Рассылка",
 
         "🔙 В главное меню",
 
-        "📱 Номер телефона", "📄 Мой профиль", "🔙 Назад в настройки"
+        "📱 Номер телефона", "📄 Мой профиль", "🎯 Интересы", "👤 Пол", "💘 Кого ищу", "🎂 Возраст", "🔙 Назад в настройки"
 
     ]
 
@@ -178,6 +163,8 @@ def is_not_command(text: str) -> bool:
 
 @router.message(
 
+    RELAY_STATES,
+
     F.text & 
 
     ~F.text.startswith("/") & 
@@ -186,23 +173,23 @@ def is_not_command(text: str) -> bool:
 
 )
 
-@router.message(F.photo & ~F.caption.startswith("/"))
+@router.message(RELAY_STATES, F.photo & ~F.caption.startswith("/"))
 
-@router.message(F.document & ~F.caption.startswith("/"))
+@router.message(RELAY_STATES, F.document & ~F.caption.startswith("/"))
 
-@router.message(F.sticker)
+@router.message(RELAY_STATES, F.sticker)
 
-@router.message(F.voice & ~F.caption.startswith("/"))
+@router.message(RELAY_STATES, F.voice & ~F.caption.startswith("/"))
 
-@router.message(F.video & ~F.caption.startswith("/"))
+@router.message(RELAY_STATES, F.video & ~F.caption.startswith("/"))
 
-@router.message(F.video_note)
+@router.message(RELAY_STATES, F.video_note)
 
-@router.message(F.animation & ~F.caption.startswith("/"))
+@router.message(RELAY_STATES, F.animation & ~F.caption.startswith("/"))
 
-@router.message(F.audio & ~F.caption.startswith("/"))
+@router.message(RELAY_STATES, F.audio & ~F.caption.startswith("/"))
 
-async def relay_message(message: Message, bot: Bot):
+async def relay_message(message: Message, bot: Bot, db: Database, outbox: Outbox, albums: AlbumBuffer, user_ctx: UserContext):
 
     user = message.from_user
 
@@ -212,100 +199,76 @@ async def relay_message(message: Message, bot: Bot):
 
     
 
-    if await db.is_blocked(user.id):
-
-        is_admin_user = await is_admin(user.id)
+    if user_ctx.blocked:
 
-        await message.answer("🚫 Ваш аккаунт заблокирован", reply_markup=build_main_keyboard(is_admin_user))
+        await message.answer("🚫 Ваш аккаунт заблокирован", reply_markup=build_main_keyboard(user_ctx.is_admin))
 
         return
 
     
 
-    partner = await db.get_partner(user.id)
+    partner = user_ctx.partner
 
     if partner is None:
 
-        is_admin_user = await is_admin(user.id)
-
-        await message.answer("❌ У вас нет активного собеседника", reply_markup=build_main_keyboard(is_admin_user))
+        await message.answer("❌ У вас нет активного собеседника", reply_markup=build_main_keyboard(user_ctx.is_admin))
 
         return
 
     
 
-    try:
-
-        if message.text:
-
-            partner_admin_status = await is_admin(partner)
-
-            await bot.send_message(partner, message.text, reply_markup=build_main_keyboard(partner_admin_status))
-
-        elif message.photo:
-
-            photo = message.photo[-1]
-
-            caption = message.caption or ""
-
-            partner_admin_status = await is_admin(partner)
-
-            await bot.send_photo(partner, photo.file_id, caption=caption, reply_markup=build_main_keyboard(partner_admin_status))
-
-        elif message.document:
+    db.touch_dialog(user.id, partner)
 
-            caption = message.caption or ""
+    if message.media_group_id:
 
-            partner_admin_status = await is_admin(partner)
+        albums.add(message, lambda messages: relay_album(outbox, db, user_ctx, partner, messages))
 
-            await bot.send_document(partner, message.document.file_id, caption=caption, reply_markup=build_main_keyboard(partner_admin_status))
+        return
 
-        elif message.sticker:
+    
 
-            partner_admin_status = await is_admin(partner)
+    try:
 
-            await bot.send_sticker(partner, message.sticker.file_id, reply_markup=build_main_keyboard(partner_admin_status))
+        # copy_message переносит любой тип содержимого вместе с подписью и разметкой одним вызовом
 
-        elif message.voice:
+        await outbox.call(CopyMessage(
 
-            caption = message.caption or ""
+            chat_id=partner, from_chat_id=message.chat.id, message_id=message.message_id,
 
-            partner_admin_status = await is_admin(partner)
+            reply_markup=build_main_keyboard(await is_admin(db, partner)),
 
-            await bot.send_voice(partner, message.voice.file_id, caption=caption, reply_markup=build_main_keyboard(partner_admin_status))
+        ))
 
-        elif message.video:
+    except Exception as e:
 
-            caption = message.caption or ""
+        await message.answer("❌ Не удалось отправить сообщение. Возможно, собеседник отключился.", reply_markup=build_main_keyboard(user_ctx.is_admin))
 
-            partner_admin_status = await is_admin(partner)
 
-            await bot.send_video(partner, message.video.file_id, caption=caption, reply_markup=build_main_keyboard(partner_admin_status))
 
-        elif message.video_note:
+async def relay_album(outbox: Outbox, db: Database, user_ctx: UserContext, partner: int, messages: List[Message]) -> None:
 
-            partner_admin_status = await is_admin(partner)
+    # Пока копился альбом, диалог мог завершиться
 
-            await bot.send_video_note(partner, message.video_note.file_id, reply_markup=build_main_keyboard(partner_admin_status))
+    if db.partners.get(user_ctx.tg_id) != partner:
 
-        elif message.animation:
+        return
 
-            caption = message.caption or ""
+    media = [item for item in map(album_media, messages) if item is not None]
 
-            partner_admin_status = await is_admin(partner)
+    try:
 
-            await bot.send_animation(partner, message.animation.file_id, caption=caption, reply_markup=build_main_keyboard(partner_admin_status))
+        if len(media) < 2:
 
-        elif message.audio:
+            # Одиночную часть (опоздала к окну или осталась при остановке) send_media_group не примет
 
-            caption = message.caption or ""
+            for message in messages:
 
-            partner_admin_status = await is_admin(partner)
+                await outbox.call(CopyMessage(chat_id=partner, from_chat_id=message.chat.id, message_id=message.message_id))
 
-            await bot.send_audio(partner, message.audio.file_id, caption=caption, reply_markup=build_main_keyboard(partner_admin_status))
+        else:
 
-    except Exception as e:
+            await outbox.call(SendMediaGroup(chat_id=partner, media=media))
 
-        is_admin_user = await is_admin(user.id)
+    except Exception:
 
-        await message.answer("❌ Не удалось отправить сообщение. Возможно, собеседник отключился.", reply_markup=build_main_keyboard(is_admin_user))
\ No newline at end of file
+        outbox.send_message(user_ctx.tg_id, "❌ Не удалось отправить альбом. Возможно, собеседник отключился.", reply_markup=build_main_keyboard(user_ctx.is_admin))
\ No newline at end of file
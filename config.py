@@ -5,6 +5,81 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "8450014507:AAHjNEduFSG6OHHSzik-tJTuqoD58WTmE
 ADMIN_IDS: Set[int] = {int(x) for x in os.getenv("ADMIN_IDS", "1051288232").strip().split(",") if x.strip().isdigit()}
 DEVELOPER_ID = 1051288232
 DB_PATH = "anonimchat.db"  
+DB_READERS = int(os.getenv("DB_READERS", "3"))
+# Профиль хранилища SQLite: WAL, чтобы читатели не ждали писателя, и облегчённый fsync
+DB_PRAGMAS = {
+    "journal_mode": os.getenv("DB_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("DB_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("DB_MMAP_SIZE", str(128 * 1024 * 1024))),
+    "cache_size": int(os.getenv("DB_CACHE_SIZE", "-16000")),  # отрицательное значение — в КиБ
+    "busy_timeout": int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000")),
+}
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "50000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+# Отложенная запись некритичных изменений: сброс раз в N мс или при накоплении M операций
+WRITE_BEHIND_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_INTERVAL_MS", "200"))
+WRITE_BEHIND_MAX_OPS = int(os.getenv("WRITE_BEHIND_MAX_OPS", "500"))
+ADMIN_PAGE_SIZE = 20
+# Ограничения на интересы в профиле: количество и длина одного интереса
+MAX_INTERESTS = 10
+MAX_INTEREST_LENGTH = 32
+MIN_AGE = 10
+MAX_AGE = 99
+# Экспорт пользователей: строк на одно чтение из курсора и сжатие файла
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+EXPORT_GZIP = os.getenv("EXPORT_GZIP", "1") == "1"
+
+GENDER_CHOICES = [
+    ("👨 Парень", "male"),
+    ("👩 Девушка", "female"),
+]
+# Веса оценки кандидатов при подборе: за общий интерес, штраф за год разницы в возрасте,
+# за репутацию (от -1 до 1) и за секунду ожидания
+MATCH_WEIGHTS = {
+    "interests": float(os.getenv("MATCH_WEIGHT_INTERESTS", "1.0")),
+    "age": float(os.getenv("MATCH_WEIGHT_AGE", "0.2")),
+    "reputation": float(os.getenv("MATCH_WEIGHT_REPUTATION", "0.5")),
+    "wait": float(os.getenv("MATCH_WEIGHT_WAIT", "0.01")),
+}
+# Кто ждёт дольше этого (сек), подбирается первым независимо от оценки; 0 — строгая очередь
+MATCH_MAX_WAIT = float(os.getenv("MATCH_MAX_WAIT", "30"))
+# Поиск, в котором никто не нашёлся за SEARCH_TIMEOUT сек, снимается; SEARCH_TIMEOUT_NOTIFY — сообщать ли об этом
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "900"))
+SEARCH_TIMEOUT_NOTIFY = os.getenv("SEARCH_TIMEOUT_NOTIFY", "1") == "1"
+# Шаг фоновых проверок по таймаутам (сек)
+SWEEP_TICK = float(os.getenv("SWEEP_TICK", "1"))
+# Недавние собеседники не подбираются снова: сколько помнить на пользователя и как долго (сек)
+RECENT_PARTNERS_LIMIT = int(os.getenv("RECENT_PARTNERS_LIMIT", "5"))
+RECENT_PARTNERS_TTL = float(os.getenv("RECENT_PARTNERS_TTL", "600"))
+# Прождавший столько секунд снова допускает недавних собеседников (иначе двое последних ждали бы друг друга до TTL);
+# не зависит от MATCH_MAX_WAIT, 0 — не допускать до истечения TTL
+RECENT_PARTNERS_FALLBACK = float(os.getenv("RECENT_PARTNERS_FALLBACK", "120"))
+# Значение seeking_gender «неважно»; NULL в базе трактуется так же
+SEEKING_ANY = "any"
+# Диалог без сообщений дольше DIALOG_IDLE_TIMEOUT сек завершается; 0 — не завершать
+DIALOG_IDLE_TIMEOUT = float(os.getenv("DIALOG_IDLE_TIMEOUT", "1800"))
+# Время активности диалога пишется в базу не чаще раза в столько секунд
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "60"))
+# Завершённые по простою диалоги обрабатываются пачками такого размера
+IDLE_NOTIFY_BATCH = int(os.getenv("IDLE_NOTIFY_BATCH", "25"))
+# Части альбома приходят отдельными апдейтами: ждём столько мс после последней, потом шлём одним send_media_group
+RELAY_ALBUM_WINDOW_MS = int(os.getenv("RELAY_ALBUM_WINDOW_MS", "500"))
+# Исходящая очередь: общий лимит Telegram ~30 сообщений/с и ~1/с в один чат (короткие всплески допускаются)
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "25"))
+OUTBOX_GLOBAL_BURST = int(os.getenv("OUTBOX_GLOBAL_BURST", "30"))
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+OUTBOX_CHAT_BURST = int(os.getenv("OUTBOX_CHAT_BURST", "3"))
+# Сколько раз повторять отправку после 429/сетевой ошибки; уведомления сверх OUTBOX_MAX_QUEUE отбрасываются
+OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES", "3"))
+OUTBOX_MAX_QUEUE = int(os.getenv("OUTBOX_MAX_QUEUE", "10000"))
+# Рассылка: получатели читаются страницами, после каждой страницы прогресс сохраняется в базу
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "200"))
+# Как часто (сек) обновлять сообщение с прогрессом рассылки
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5"))
+# Реакции приходят админам сводкой раз в столько секунд (0 — отдельным сообщением на каждую реакцию)
+REACTION_DIGEST_INTERVAL = float(os.getenv("REACTION_DIGEST_INTERVAL", "300"))
+# Сколько самых активных пользователей перечислять в сводке
+REACTION_DIGEST_TOP = int(os.getenv("REACTION_DIGEST_TOP", "10"))
 
 REACTION_CHOICES = [
     ("👍", "like"),
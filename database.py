@@ -1,191 +1,723 @@
 import aiosqlite
 import asyncio
 import csv
-from typing import Optional, Tuple, List, Dict
-from config import DB_PATH
+import gzip
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple, List, Dict, Any, Callable, Iterable, NamedTuple
+from config import (
+    DB_PATH, DB_READERS, DB_PRAGMAS, USER_CACHE_SIZE, USER_CACHE_TTL,
+    WRITE_BEHIND_INTERVAL_MS, WRITE_BEHIND_MAX_OPS, ADMIN_PAGE_SIZE, EXPORT_CHUNK_SIZE,
+    MAX_INTERESTS, MAX_INTEREST_LENGTH, DIALOG_IDLE_TIMEOUT, ACTIVITY_FLUSH_INTERVAL, SWEEP_TICK,
+)
+from migrations import migrate
+from timing_wheel import TimingWheel
 from datetime import datetime, timedelta
 
+def normalize_interests(raw: Optional[str]) -> Tuple[str, ...]:
+    # Интересы хранятся строкой через запятую; в памяти — кортеж без повторов в исходном порядке
+    if not raw:
+        return ()
+    parts = (p.strip().lower()[:MAX_INTEREST_LENGTH] for p in str(raw).split(","))
+    return tuple(dict.fromkeys(p for p in parts if p))[:MAX_INTERESTS]
+
+class UserState(NamedTuple):
+    username: Optional[str]
+    blocked: bool
+    is_admin: bool
+    interests: Tuple[str, ...] = ()
+    gender: Optional[str] = None
+    seeking_gender: Optional[str] = None
+    age: Optional[int] = None
+    reputation: int = 0
+
+class WaitingUser(NamedTuple):
+    tg_id: int
+    gender: Optional[str]
+    seeking_gender: Optional[str]
+    interests: Tuple[str, ...]
+    age: Optional[int]
+    reputation: int
+    search_started_at: Optional[float]
+
+class Broadcast(NamedTuple):
+    id: int
+    created_by: int
+    from_chat_id: int
+    message_id: int
+    progress_chat_id: Optional[int]
+    progress_message_id: Optional[int]
+    status: str
+    cursor: int
+    total: int
+    sent: int
+    failed: int
+    unreachable: int
+
+BROADCAST_COLUMNS = "id, created_by, from_chat_id, message_id, progress_chat_id, progress_message_id, status, cursor, total, sent, failed, unreachable"
+
+class UserStateCache:
+    # LRU с TTL; None в записи означает «пользователя нет в базе»
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Меняется при сбросе всего кэша
+        self.generation = 0
+        # Только для пользователей, чьё чтение из БД сейчас идёт: [чтений в полёте, записей с их начала]
+        self._reads: Dict[int, List[int]] = {}
+        self._entries: "OrderedDict[int, Tuple[float, Optional[UserState]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, tg_id: int) -> Tuple[bool, Optional[UserState]]:
+        entry = self._entries.get(tg_id)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(tg_id)
+        self.hits += 1
+        return True, entry[1]
+
+    def begin_read(self, tg_id: int) -> Tuple[int, int]:
+        reads = self._reads.setdefault(tg_id, [0, 0])
+        reads[0] += 1
+        return self.generation, reads[1]
+
+    def end_read(self, tg_id: int, token: Tuple[int, int]) -> bool:
+        # True, если за время чтения не было записи этого пользователя и сброса кэша — прочитанное можно класть
+        reads = self._reads[tg_id]
+        reads[0] -= 1
+        if not reads[0]:
+            del self._reads[tg_id]
+        return token == (self.generation, reads[1])
+
+    def put(self, tg_id: int, state: Optional[UserState]) -> None:
+        self._entries[tg_id] = (time.monotonic() + self.ttl, state)
+        self._entries.move_to_end(tg_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _written(self, tg_id: int) -> None:
+        reads = self._reads.get(tg_id)
+        if reads is not None:
+            reads[1] += 1
+
+    def update(self, tg_id: int, **changes) -> None:
+        self._written(tg_id)
+        entry = self._entries.get(tg_id)
+        if entry is None:
+            return
+        if entry[1] is None:
+            del self._entries[tg_id]
+            return
+        self._entries[tg_id] = (entry[0], entry[1]._replace(**changes))
+
+    def invalidate(self, tg_id: Optional[int] = None) -> None:
+        if tg_id is None:
+            self.generation += 1
+            self._entries.clear()
+        else:
+            self._written(tg_id)
+            self._entries.pop(tg_id, None)
+
+class PartnerMap:
+    # Зеркало users.partner_tg_id в памяти: пересылка сообщений не ходит в БД за собеседником
+    def __init__(self) -> None:
+        self._partners: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._partners)
+
+    def get(self, tg_id: int) -> Optional[int]:
+        return self._partners.get(tg_id)
+
+    def load(self, rows) -> None:
+        self._partners = {int(tg_id): int(partner) for tg_id, partner in rows}
+
+    def set(self, tg_id: int, partner_tg_id: Optional[int]) -> None:
+        if partner_tg_id is None:
+            self._partners.pop(tg_id, None)
+        else:
+            self._partners[tg_id] = partner_tg_id
+
+    def link(self, a: int, b: int) -> None:
+        self.unlink(a)
+        self.unlink(b)
+        self._partners[a] = b
+        self._partners[b] = a
+
+    def unlink(self, tg_id: int) -> Optional[int]:
+        partner = self._partners.pop(tg_id, None)
+        if partner is not None and self._partners.get(partner) == tg_id:
+            del self._partners[partner]
+        return partner
+
+class DialogActivity:
+    # Последняя активность диалогов (unix-время) в памяти, ключ — (меньший tg_id, больший tg_id).
+    # Сообщение только обновляет время; срок простоя лежит в колесе таймеров и при срабатывании
+    # перепроверяется: была активность — срок переносится, иначе диалог отдаётся на завершение
+    def __init__(self, timeout: float = DIALOG_IDLE_TIMEOUT, flush_interval: float = ACTIVITY_FLUSH_INTERVAL, tick: float = SWEEP_TICK) -> None:
+        self.timeout = timeout
+        self.flush_interval = flush_interval
+        self.wheel = TimingWheel(tick=tick, now=time.time())
+        self._last: Dict[Tuple[int, int], float] = {}
+        self._flushed: Dict[Tuple[int, int], float] = {}
+        self.ended = 0
+
+    def __len__(self) -> int:
+        return len(self._last)
+
+    @staticmethod
+    def key(a: int, b: int) -> Tuple[int, int]:
+        return (a, b) if a < b else (b, a)
+
+    def start(self, a: int, b: int, at: Optional[float] = None) -> None:
+        key = self.key(a, b)
+        at = time.time() if at is None else at
+        self._last[key] = at
+        self._flushed[key] = at
+        if self.timeout > 0:
+            self.wheel.schedule(key, at + self.timeout)
+
+    def end(self, a: int, b: int) -> None:
+        # Срок в колесе остаётся и будет пропущен в idle(); запись в памяти не должна пережить диалог,
+        # иначе при выключенном таймауте (колесо пустое) она не удалится никогда
+        key = self.key(a, b)
+        self._last.pop(key, None)
+        self._flushed.pop(key, None)
+
+    def load(self, rows: Iterable[Tuple[int, int, Optional[float]]]) -> None:
+        # В базе время отстаёт от памяти на flush_interval, поэтому более свежее значение из памяти не затирается
+        now = time.time()
+        for tg_id, partner, last_activity_at in rows:
+            if tg_id < partner:
+                at = now if last_activity_at is None else min(float(last_activity_at), now)
+                self.start(tg_id, partner, max(at, self._last.get((tg_id, partner), at)))
+
+    def touch(self, a: int, b: int, now: float) -> bool:
+        # True, если пора записать время в базу: не чаще раза в flush_interval на диалог
+        key = self.key(a, b)
+        if key not in self._last:
+            self.start(a, b, now)
+            return True
+        self._last[key] = now
+        if now - self._flushed[key] < self.flush_interval:
+            return False
+        self._flushed[key] = now
+        return True
+
+    def idle(self, now: float) -> List[Tuple[int, int]]:
+        idle = []
+        for key in self.wheel.advance(now):
+            last = self._last.get(key)
+            if last is None:
+                continue
+            if last + self.timeout > now:
+                self.wheel.schedule(key, last + self.timeout)
+                continue
+            del self._last[key]
+            del self._flushed[key]
+            idle.append(key)
+        return idle
+
+class WriteBehind:
+    # Группирует некритичные UPDATE в одну транзакцию: флаги поиска, обновления username и т.п.
+    # Ключ операции — (вид, tg_id): повторная запись того же ключа заменяет предыдущую
+    def __init__(self, db: "Database", interval_ms: int = WRITE_BEHIND_INTERVAL_MS, max_ops: int = WRITE_BEHIND_MAX_OPS) -> None:
+        self.db = db
+        self.interval = interval_ms / 1000
+        self.max_ops = max_ops
+        self.batches = 0
+        self.ops_written = 0
+        self.coalesced = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._pending: "OrderedDict[Tuple[str, int], Tuple[str, tuple]]" = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, key: Tuple[str, int], sql: str, params: tuple) -> None:
+        if key in self._pending:
+            self.coalesced += 1
+        self._pending[key] = (sql, params)
+        if len(self._pending) >= self.max_ops:
+            self._wakeup.set()
+
+    def discard(self, key: Tuple[str, int]) -> None:
+        self._pending.pop(key, None)
+
+    def discard_kind(self, kind: str) -> None:
+        for key in [key for key in self._pending if key[0] == kind]:
+            del self._pending[key]
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Ошибка отложенной записи: {e}")
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        # Пачка забирается уже под блокировкой писателя: критичные записи, снявшие
+        # свои ключи через discard, не будут перезаписаны устаревшими значениями
+        async with self.db.writer() as conn:
+            batch = self._pending
+            self._pending = OrderedDict()
+            started = time.perf_counter()
+            grouped: Dict[str, List[tuple]] = {}
+            for sql, params in batch.values():
+                grouped.setdefault(sql, []).append(params)
+            try:
+                for sql, rows in grouped.items():
+                    await conn.executemany(sql, rows)
+            except BaseException:
+                for key, value in batch.items():
+                    self._pending.setdefault(key, value)
+                raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.batches += 1
+        self.ops_written += len(batch)
+        self.last_batch_size = len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+
+class UserPage(NamedTuple):
+    rows: List[tuple]
+    has_prev: bool
+    has_next: bool
+
+# Фильтры админских списков; каждому соответствует индекс по (registered_at, id)
+USER_LISTS: Dict[str, str] = {
+    "all": "1",
+    "searching": "in_search = 1",
+    "blocked": "blocked = 1",
+}
+
+EXPORT_COLUMNS = [
+    "tg_id", "username", "registered_at", "in_search", "partner_tg_id",
+    "blocked", "is_admin", "gender", "seeking_gender", "age", "interests", "reputation",
+]
+
+async def stream_csv(conn: aiosqlite.Connection, sql: str, header: List[str], file_path: str, compress: bool = False, chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+    # Курсор читается кусками по chunk_size строк, а открытие, запись и сжатие файла идут в пуле потоков:
+    # память не зависит от размера таблицы, а цикл событий не блокируется на диске
+    loop = asyncio.get_running_loop()
+    if compress:
+        f = await loop.run_in_executor(None, lambda: gzip.open(file_path, "wt", newline="", encoding="utf-8"))
+    else:
+        f = await loop.run_in_executor(None, lambda: open(file_path, "w", newline="", encoding="utf-8"))
+    written = 0
+    try:
+        writer = csv.writer(f)
+        await loop.run_in_executor(None, writer.writerow, header)
+        async with conn.execute(sql) as cur:
+            while True:
+                rows = await cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                await loop.run_in_executor(None, writer.writerows, rows)
+                written += len(rows)
+    finally:
+        await loop.run_in_executor(None, f.close)
+    return written
+
+# Не больше стольких id в одном IN (...) — запас до SQLITE_MAX_VARIABLE_NUMBER старых сборок (999)
+USERS_BATCH_SIZE = 500
+
 class Database:
-    def __init__(self, path: str = DB_PATH) -> None:
+    def __init__(self, path: str = DB_PATH, readers: int = DB_READERS, pragmas: Optional[Dict[str, Any]] = None) -> None:
         self.path = path
+        self.pragmas = dict(DB_PRAGMAS if pragmas is None else pragmas)
+        self.cache = UserStateCache()
+        self.partners = PartnerMap()
+        self.activity = DialogActivity()
+        # Уже записанные в базу пользователи и их username; ограничен, как и кэш состояний, — вытесняются давно не писавшие
+        self._known_users: "OrderedDict[int, Optional[str]]" = OrderedDict()
+        self.write_behind = WriteBehind(self)
         self._lock = asyncio.Lock()
         self._connection = None
+        self._reader_count = max(1, readers)
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: List[aiosqlite.Connection] = []
+        self._reader_slots: Optional[asyncio.Semaphore] = None
+        self._readers_lock = asyncio.Lock()
 
     async def get_connection(self):
+        # Единственное соединение на запись — SQLite всё равно пускает только одного писателя
         if self._connection is None:
-            self._connection = await aiosqlite.connect(self.path)
+            conn = await aiosqlite.connect(self.path)
+            await self._apply_pragmas(conn, writer=True)
+            self._connection = conn
         return self._connection
 
+    async def _apply_pragmas(self, conn: aiosqlite.Connection, writer: bool) -> None:
+        for name, value in self.pragmas.items():
+            # Режим журнала хранится в самом файле БД, его выставляет только писатель
+            if name == "journal_mode" and not writer:
+                continue
+            await conn.execute(f"PRAGMA {name} = {value}")
+        if not writer:
+            await conn.execute("PRAGMA query_only = 1")
+
+    async def _open_readers(self) -> None:
+        async with self._readers_lock:
+            if self._reader_slots is not None:
+                return
+            for _ in range(self._reader_count):
+                conn = await aiosqlite.connect(f"file:{self.path}?mode=ro", uri=True)
+                await self._apply_pragmas(conn, writer=False)
+                self._readers.append(conn)
+            self._idle_readers = list(self._readers)
+            self._reader_slots = asyncio.Semaphore(len(self._readers))
+
+    @asynccontextmanager
+    async def reader(self):
+        if self._reader_slots is None:
+            await self._open_readers()
+        # Семафор выдаёт соединения в порядке очереди, иначе горячая корутина забирает их себе
+        async with self._reader_slots:
+            conn = self._idle_readers.pop()
+            try:
+                yield conn
+            finally:
+                self._idle_readers.append(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        # Транзакции разных корутин не должны перемешиваться на общем соединении
+        async with self._lock:
+            conn = await self.get_connection()
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
+            await conn.commit()
+
+    async def flush(self) -> None:
+        await self.write_behind.flush()
+
     async def close(self):
+        await self.write_behind.stop()
+        for conn in self._readers:
+            await conn.close()
+        self._readers = []
+        self._idle_readers = []
+        self._reader_slots = None
         if self._connection:
             await self._connection.close()
             self._connection = None
 
     async def init(self) -> None:
-        conn = await self.get_connection()
-        await conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tg_id INTEGER UNIQUE NOT NULL,
-                username TEXT,
-                registered_at TEXT DEFAULT (datetime('now')),
-                in_search INTEGER DEFAULT 0,
-                partner_tg_id INTEGER,
-                blocked INTEGER DEFAULT 0,
-                is_admin INTEGER DEFAULT 0
-            )
-            """
-        )
-        await conn.commit()
+        async with self._lock:
+            await migrate(await self.get_connection())
+        await self.repair_dialogs()
+        await self._open_readers()
+        self.write_behind.start()
 
     async def ensure_user(self, tg_id: int, username: Optional[str]) -> None:
-        conn = await self.get_connection()
-        cur = await conn.execute("SELECT tg_id FROM users WHERE tg_id = ?", (tg_id,))
-        row = await cur.fetchone()
-        if row is None:
+        # Повторные /start и «Поиск» с тем же username не доходят до базы
+        if tg_id in self._known_users:
+            self._known_users.move_to_end(tg_id)
+            if self._known_users[tg_id] != username:
+                # Пользователь точно есть в базе — смену username можно записать позже
+                self.write_behind.put(("username", tg_id), "UPDATE users SET username = ? WHERE tg_id = ?", (username, tg_id))
+                self._known_users[tg_id] = username
+                self.cache.update(tg_id, username=username)
+            return
+        async with self.writer() as conn:
             await conn.execute(
-                "INSERT INTO users (tg_id, username) VALUES (?, ?)",
+                # Написавший снова пользователь снова доступен для рассылок
+                "INSERT INTO users (tg_id, username) VALUES (?, ?) "
+                "ON CONFLICT(tg_id) DO UPDATE SET username = excluded.username, unreachable = 0 "
+                "WHERE username IS NOT excluded.username OR unreachable = 1",
                 (tg_id, username),
             )
-        else:
-            await conn.execute("UPDATE users SET username = ? WHERE tg_id = ?", (username, tg_id))
-        await conn.commit()
+        self._known_users[tg_id] = username
+        while len(self._known_users) > self.cache.maxsize:
+            self._known_users.popitem(last=False)
+        self.cache.update(tg_id, username=username)
 
     async def set_in_search(self, tg_id: int, in_search: bool) -> None:
-        conn = await self.get_connection()
-        await conn.execute(
-            "UPDATE users SET in_search = ? WHERE tg_id = ?",
-            (1 if in_search else 0, tg_id),
+        self.write_behind.put(
+            ("in_search", tg_id),
+            # Повторный поиск не сбрасывает время начала ожидания
+            "UPDATE users SET in_search = ?, search_started_at = CASE WHEN ? THEN COALESCE(search_started_at, ?) END WHERE tg_id = ?",
+            (1 if in_search else 0, 1 if in_search else 0, time.time(), tg_id),
         )
-        await conn.commit()
+
+    async def get_user_state(self, tg_id: int) -> Optional[UserState]:
+        hit, state = self.cache.get(tg_id)
+        if hit:
+            return state
+        token = self.cache.begin_read(tg_id)
+        try:
+            async with self.reader() as conn:
+                cur = await conn.execute(
+                    "SELECT username, blocked, is_admin, interests, gender, seeking_gender, age, reputation FROM users WHERE tg_id = ?",
+                    (tg_id,),
+                )
+                row = await cur.fetchone()
+        finally:
+            fresh = self.cache.end_read(tg_id, token)
+        if row:
+            state = UserState(
+                username=row[0], blocked=bool(row[1]), is_admin=bool(row[2]),
+                interests=normalize_interests(row[3]), gender=row[4], seeking_gender=row[5],
+                age=row[6], reputation=int(row[7] or 0),
+            )
+        if fresh:
+            self.cache.put(tg_id, state)
+        return state
 
     async def is_blocked(self, tg_id: int) -> bool:
-        conn = await self.get_connection()
-        cur = await conn.execute("SELECT blocked FROM users WHERE tg_id = ?", (tg_id,))
-        row = await cur.fetchone()
-        return bool(row and row[0])
+        state = await self.get_user_state(tg_id)
+        return bool(state and state.blocked)
 
-    async def set_blocked(self, tg_id: int, blocked: bool) -> None:
-        conn = await self.get_connection()
-        await conn.execute("UPDATE users SET blocked = ? WHERE tg_id = ?", (1 if blocked else 0, tg_id))
-        await conn.commit()
+    async def is_admin(self, tg_id: int) -> bool:
+        state = await self.get_user_state(tg_id)
+        return bool(state and state.is_admin)
 
-    # Убираем метод update_profile с phone_number
-    async def update_profile(self, tg_id: int) -> None:
-        # Оставляем пустым или удаляем вызовы этого метода
-        pass
+    async def set_blocked(self, tg_id: int, blocked: bool) -> None:
+        async with self.writer() as conn:
+            await conn.execute("UPDATE users SET blocked = ? WHERE tg_id = ?", (1 if blocked else 0, tg_id))
+        self.cache.update(tg_id, blocked=blocked)
 
-    async def get_profile(self, tg_id: int) -> Dict[str, Optional[object]]:
-        # Возвращаем пустой профиль
-        return {}
+    async def update_profile(self, tg_id: int, *, gender: Optional[str] = None, seeking_gender: Optional[str] = None, age: Optional[int] = None, interests: Optional[Iterable[str]] = None) -> None:
+        sets = []
+        vals: List[object] = []
+        changes: Dict[str, Any] = {}
+        if age is not None:
+            sets.append("age = ?")
+            vals.append(age)
+            changes["age"] = age
+        if gender is not None:
+            sets.append("gender = ?")
+            vals.append(gender)
+            changes["gender"] = gender
+        if seeking_gender is not None:
+            sets.append("seeking_gender = ?")
+            vals.append(seeking_gender)
+            changes["seeking_gender"] = seeking_gender
+        if interests is not None:
+            normalized = normalize_interests(",".join(interests))
+            sets.append("interests = ?")
+            vals.append(",".join(normalized) or None)
+            changes["interests"] = normalized
+        if not sets:
+            return
+        vals.append(tg_id)
+        async with self.writer() as conn:
+            await conn.execute(f"UPDATE users SET {', '.join(sets)} WHERE tg_id = ?", vals)
+        self.cache.update(tg_id, **changes)
 
-    async def find_match(self, requester_tg_id: int) -> Optional[int]:
-        async with self._lock:
-            conn = await self.get_connection()
-            cur = await conn.execute("SELECT blocked FROM users WHERE tg_id = ?", (requester_tg_id,))
+    async def get_profile(self, tg_id: int) -> Dict[str, Any]:
+        async with self.reader() as conn:
+            cur = await conn.execute("SELECT gender, seeking_gender, age, interests, reputation FROM users WHERE tg_id = ?", (tg_id,))
             row = await cur.fetchone()
-            if row and int(row[0]) == 1:
-                return None
-            
-            sql = "SELECT tg_id FROM users WHERE tg_id != ? AND in_search = 1 AND partner_tg_id IS NULL AND (blocked IS NULL OR blocked = 0) LIMIT 1"
-            cur = await conn.execute(sql, (requester_tg_id,))
-            candidate = await cur.fetchone()
-            
-            if not candidate:
-                return None
-            
-            partner_tg_id = int(candidate[0])
-            
-            await conn.execute(
-                "UPDATE users SET partner_tg_id = ?, in_search = 0 WHERE tg_id = ?",
-                (partner_tg_id, requester_tg_id),
+        if not row:
+            return {"gender": None, "seeking_gender": None, "age": None, "interests": (), "reputation": 0}
+        return {"gender": row[0], "seeking_gender": row[1], "age": row[2], "interests": normalize_interests(row[3]), "reputation": int(row[4] or 0)}
+
+    async def add_reaction(self, rater_tg_id: int, partner_tg_id: int, reaction: str, delta: int) -> bool:
+        # Репутация меняется только при первой оценке пары; повторная (в том числе после перезапуска) игнорируется.
+        # Оценить можно только последнего собеседника — id из callback_data сам по себе ничего не доказывает
+        async with self.writer() as conn:
+            cur = await conn.execute(
+                "INSERT OR IGNORE INTO reactions (rater_tg_id, partner_tg_id, reaction) "
+                "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM users WHERE tg_id = ? AND last_partner_tg_id = ?)",
+                (rater_tg_id, partner_tg_id, reaction, rater_tg_id, partner_tg_id),
             )
-            await conn.execute(
-                "UPDATE users SET partner_tg_id = ?, in_search = 0 WHERE tg_id = ?",
-                (requester_tg_id, partner_tg_id),
+            if not cur.rowcount:
+                return False
+            await conn.execute("UPDATE users SET reputation = reputation + ? WHERE tg_id = ?", (delta, partner_tg_id))
+        self.cache.invalidate(partner_tg_id)
+        return True
+
+    async def list_waiting(self) -> List[WaitingUser]:
+        async with self.reader() as conn:
+            cur = await conn.execute(
+                "SELECT tg_id, gender, seeking_gender, interests, age, reputation, search_started_at FROM users "
+                "WHERE in_search = 1 AND partner_tg_id IS NULL AND (blocked IS NULL OR blocked = 0) ORDER BY search_started_at"
+            )
+            return [WaitingUser(int(r[0]), r[1], r[2], normalize_interests(r[3]), r[4], int(r[5] or 0), r[6]) for r in await cur.fetchall()]
+
+    async def pair_users(self, a: int, b: int) -> bool:
+        if a == b:
+            return False
+        now = time.time()
+        async with self.writer() as conn:
+            # Одно выражение на обоих: пара создаётся, только если оба свободны и не заблокированы
+            cur = await conn.execute(
+                "UPDATE users SET partner_tg_id = CASE tg_id WHEN ? THEN ? ELSE ? END, last_partner_tg_id = CASE tg_id WHEN ? THEN ? ELSE ? END, "
+                "in_search = 0, search_started_at = NULL, last_activity_at = ? "
+                "WHERE tg_id IN (?, ?) AND partner_tg_id IS NULL AND (blocked IS NULL OR blocked = 0)",
+                (a, b, a, a, b, a, now, a, b),
             )
+            if cur.rowcount != 2:
+                await conn.rollback()
+                return False
             await conn.commit()
-            return partner_tg_id
+            self.partners.link(a, b)
+            self.activity.start(a, b, now)
+            self.write_behind.discard(("in_search", a))
+            self.write_behind.discard(("in_search", b))
+        return True
 
     async def set_partner(self, tg_id: int, partner_tg_id: Optional[int]) -> None:
-        conn = await self.get_connection()
-        await conn.execute(
-            "UPDATE users SET partner_tg_id = ? WHERE tg_id = ?",
-            (partner_tg_id, tg_id),
-        )
-        await conn.commit()
+        async with self.writer() as conn:
+            await conn.execute(
+                "UPDATE users SET partner_tg_id = ? WHERE tg_id = ?",
+                (partner_tg_id, tg_id),
+            )
+            await conn.commit()
+            self.partners.set(tg_id, partner_tg_id)
 
     async def get_partner(self, tg_id: int) -> Optional[int]:
-        conn = await self.get_connection()
-        cur = await conn.execute(
-            "SELECT partner_tg_id FROM users WHERE tg_id = ?",
-            (tg_id,),
-        )
-        row = await cur.fetchone()
-        if row and row[0] is not None:
-            return int(row[0])
-        return None
+        return self.partners.get(tg_id)
 
-    async def clear_dialog(self, tg_a: int, tg_b: int) -> None:
-        conn = await self.get_connection()
-        await conn.execute(
-            "UPDATE users SET partner_tg_id = NULL WHERE tg_id IN (?, ?)",
-            (tg_a, tg_b),
-        )
-        await conn.commit()
+    def touch_dialog(self, tg_id: int, partner_tg_id: int) -> None:
+        # Вызывается на каждое пересланное сообщение: в базу уходит не больше одной записи за flush_interval
+        now = time.time()
+        if self.activity.touch(tg_id, partner_tg_id, now):
+            a, b = self.activity.key(tg_id, partner_tg_id)
+            self.write_behind.put(("activity", a), "UPDATE users SET last_activity_at = ? WHERE tg_id IN (?, ?)", (now, a, b))
 
-    async def end_dialog_for(self, tg_id: int) -> Optional[int]:
-        conn = await self.get_connection()
-        cur = await conn.execute(
-            "SELECT partner_tg_id FROM users WHERE tg_id = ?",
-            (tg_id,),
-        )
-        row = await cur.fetchone()
-        if row and row[0] is not None:
-            partner = int(row[0])
+    def idle_dialogs(self, now: Optional[float] = None) -> List[Tuple[int, int]]:
+        # Сроки завершившихся диалогов не снимаются при завершении, а отбрасываются здесь
+        return [(a, b) for a, b in self.activity.idle(time.time() if now is None else now) if self.partners.get(a) == b]
+
+    async def clear_dialog(self, tg_a: int, tg_b: int) -> None:
+        async with self.writer() as conn:
             await conn.execute(
-                "UPDATE users SET partner_tg_id = NULL WHERE tg_id IN (?, ?)",
-                (tg_id, partner),
+                "UPDATE users SET partner_tg_id = NULL WHERE (tg_id = ? AND partner_tg_id = ?) OR (tg_id = ? AND partner_tg_id = ?)",
+                (tg_a, tg_b, tg_b, tg_a),
             )
             await conn.commit()
-            return partner
+            if self.partners.get(tg_a) == tg_b:
+                self.partners.set(tg_a, None)
+            if self.partners.get(tg_b) == tg_a:
+                self.partners.set(tg_b, None)
+            self.activity.end(tg_a, tg_b)
+
+    async def end_dialog_for(self, tg_id: int) -> Optional[int]:
+        async with self.writer() as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            cur = await conn.execute(
+                "SELECT partner_tg_id FROM users WHERE tg_id = ?",
+                (tg_id,),
+            )
+            row = await cur.fetchone()
+            if row and row[0] is not None:
+                partner = int(row[0])
+                # Собеседника отвязываем, только если он действительно ссылается на нас
+                await conn.execute(
+                    "UPDATE users SET partner_tg_id = NULL WHERE tg_id = ? OR (tg_id = ? AND partner_tg_id = ?)",
+                    (tg_id, partner, tg_id),
+                )
+                await conn.commit()
+                self.partners.unlink(tg_id)
+                self.activity.end(tg_id, partner)
+                return partner
         return None
 
+    async def repair_dialogs(self) -> int:
+        # Разрывает несимметричные пары (A -> B, но B -> C или B свободен) и ссылки на самого себя
+        async with self.writer() as conn:
+            cur = await conn.execute(
+                """
+                UPDATE users SET partner_tg_id = NULL
+                WHERE partner_tg_id IS NOT NULL AND (
+                    partner_tg_id = tg_id OR NOT EXISTS (
+                        SELECT 1 FROM users AS p WHERE p.tg_id = users.partner_tg_id AND p.partner_tg_id = users.tg_id
+                    )
+                )
+                """
+            )
+            repaired = cur.rowcount
+            await conn.commit()
+            cur = await conn.execute("SELECT tg_id, partner_tg_id, last_activity_at FROM users WHERE partner_tg_id IS NOT NULL")
+            rows = await cur.fetchall()
+            self.partners.load((tg_id, partner) for tg_id, partner, _ in rows)
+            self.activity.load(rows)
+        return repaired
+
+    async def counters(self) -> Dict[str, int]:
+        async with self.reader() as conn:
+            cur = await conn.execute("SELECT name, value FROM user_counters")
+            return {name: int(value) for name, value in await cur.fetchall()}
+
     async def stats(self) -> Tuple[int, int, int]:
-        conn = await self.get_connection()
-        cur = await conn.execute("SELECT COUNT(*) FROM users")
-        total_users = int((await cur.fetchone())[0])
-        cur = await conn.execute("SELECT COUNT(*) FROM users WHERE in_search = 1")
-        searching_users = int((await cur.fetchone())[0])
-        cur = await conn.execute("SELECT COUNT(*) FROM users WHERE partner_tg_id IS NOT NULL")
-        in_dialog = int((await cur.fetchone())[0])
-        active_dialogs = in_dialog // 2
-        return total_users, searching_users, active_dialogs
+        counters = await self.counters()
+        active_dialogs = counters.get("in_dialog", 0) // 2
+        return counters.get("total", 0), counters.get("searching", 0), active_dialogs
 
     async def list_searching(self, limit: int = 50) -> List[int]:
-        conn = await self.get_connection()
-        cur = await conn.execute("SELECT tg_id FROM users WHERE in_search = 1 ORDER BY registered_at DESC LIMIT ?", (limit,))
-        return [int(r[0]) for r in await cur.fetchall()]
+        async with self.reader() as conn:
+            cur = await conn.execute("SELECT tg_id FROM users WHERE in_search = 1 ORDER BY registered_at DESC LIMIT ?", (limit,))
+            return [int(r[0]) for r in await cur.fetchall()]
 
     async def list_dialog_pairs(self, limit: int = 50) -> List[Tuple[int, int]]:
         pairs = []
-        conn = await self.get_connection()
-        cur = await conn.execute("SELECT tg_id, partner_tg_id FROM users WHERE partner_tg_id IS NOT NULL LIMIT ?", (limit * 2,))
+        async with self.reader() as conn:
+            cur = await conn.execute("SELECT tg_id, partner_tg_id FROM users WHERE partner_tg_id IS NOT NULL LIMIT ?", (limit * 2,))
+            rows = await cur.fetchall()
         seen = set()
-        for tg_id, partner in await cur.fetchall():
+        for tg_id, partner in rows:
             if tg_id in seen or partner is None:
                 continue
             pairs.append((int(tg_id), int(partner)))
             seen.add(int(tg_id)); seen.add(int(partner))
         return pairs
 
-    async def get_user(self, tg_id: int) -> Optional[Dict[str, Optional[int]]]:
-        conn = await self.get_connection()
-        cur = await conn.execute("SELECT tg_id, username, registered_at, in_search, partner_tg_id, blocked, is_admin FROM users WHERE tg_id = ?", (tg_id,))
-        row = await cur.fetchone()
-        if not row:
-            return None
+    async def list_dialog_pairs_with_names(self, limit: int = 50) -> List[Tuple[int, Optional[str], int, Optional[str]]]:
+        # Обе стороны диалога одним self-join; каждая пара попадает один раз (a.tg_id < b.tg_id)
+        async with self.reader() as conn:
+            cur = await conn.execute(
+                """
+                SELECT a.tg_id, a.username, b.tg_id, b.username
+                FROM users a JOIN users b ON b.tg_id = a.partner_tg_id
+                WHERE a.partner_tg_id IS NOT NULL AND a.tg_id < b.tg_id AND b.partner_tg_id = a.tg_id
+                LIMIT ?
+                """,
+                (limit,),
+            )
+            rows = await cur.fetchall()
+        return [(int(a), a_name, int(b), b_name) for a, a_name, b, b_name in rows]
+
+    @staticmethod
+    def _user_row(row) -> Dict[str, Optional[int]]:
         return {
             "tg_id": int(row[0]),
             "username": row[1],
@@ -196,41 +728,195 @@ class Database:
             "is_admin": bool(row[6]) if row[6] is not None else False
         }
 
-    async def force_pair(self, a: int, b: int) -> None:
-        conn = await self.get_connection()
-        await conn.execute("UPDATE users SET partner_tg_id = ?, in_search = 0 WHERE tg_id = ?", (b, a))
-        await conn.execute("UPDATE users SET partner_tg_id = ?, in_search = 0 WHERE tg_id = ?", (a, b))
-        await conn.commit()
+    async def get_user(self, tg_id: int) -> Optional[Dict[str, Optional[int]]]:
+        async with self.reader() as conn:
+            cur = await conn.execute("SELECT tg_id, username, registered_at, in_search, partner_tg_id, blocked, is_admin FROM users WHERE tg_id = ?", (tg_id,))
+            row = await cur.fetchone()
+        if not row:
+            return None
+        return self._user_row(row)
+
+    async def get_users(self, tg_ids: Iterable[int]) -> Dict[int, Dict[str, Optional[int]]]:
+        # Пакетная выборка вместо get_user в цикле; id режутся на куски под лимит параметров SQLite
+        ids = list(dict.fromkeys(tg_ids))
+        users: Dict[int, Dict[str, Optional[int]]] = {}
+        if not ids:
+            return users
+        async with self.reader() as conn:
+            for start in range(0, len(ids), USERS_BATCH_SIZE):
+                chunk = ids[start:start + USERS_BATCH_SIZE]
+                cur = await conn.execute(
+                    f"SELECT tg_id, username, registered_at, in_search, partner_tg_id, blocked, is_admin FROM users WHERE tg_id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for row in await cur.fetchall():
+                    user = self._user_row(row)
+                    users[user["tg_id"]] = user
+        return users
+
+    async def force_pair(self, a: int, b: int) -> Optional[List[int]]:
+        # Админское соединение: текущие диалоги обоих разрываются в той же транзакции.
+        # Возвращает бывших собеседников или None, если кого-то из двоих нет в базе
+        if a == b:
+            return None
+        now = time.time()
+        async with self.writer() as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            cur = await conn.execute(
+                "SELECT tg_id FROM users WHERE partner_tg_id IN (?, ?) AND tg_id NOT IN (?, ?)",
+                (a, b, a, b),
+            )
+            displaced = [int(r[0]) for r in await cur.fetchall()]
+            await conn.execute(
+                "UPDATE users SET partner_tg_id = NULL WHERE partner_tg_id IN (?, ?) AND tg_id NOT IN (?, ?)",
+                (a, b, a, b),
+            )
+            cur = await conn.execute(
+                "UPDATE users SET partner_tg_id = CASE tg_id WHEN ? THEN ? ELSE ? END, last_partner_tg_id = CASE tg_id WHEN ? THEN ? ELSE ? END, "
+                "in_search = 0, search_started_at = NULL, last_activity_at = ? WHERE tg_id IN (?, ?)",
+                (a, b, a, a, b, a, now, a, b),
+            )
+            if cur.rowcount != 2:
+                await conn.rollback()
+                return None
+            await conn.commit()
+            for tg_id in displaced:
+                old_partner = self.partners.get(tg_id)
+                if old_partner is not None:
+                    self.activity.end(tg_id, old_partner)
+                self.partners.set(tg_id, None)
+            self.partners.link(a, b)
+            self.activity.start(a, b, now)
+            self.write_behind.discard(("in_search", a))
+            self.write_behind.discard(("in_search", b))
+        return displaced
 
     async def force_unpair(self, tg_id: int) -> Optional[int]:
         return await self.end_dialog_for(tg_id)
 
+    async def list_users_page(self, kind: str, cursor: Optional[int] = None, backward: bool = False, limit: int = ADMIN_PAGE_SIZE) -> UserPage:
+        # Keyset-пагинация от новых к старым по (registered_at, id); cursor — id граничной строки.
+        # Строки: (id, tg_id, username, registered_at, blocked, is_admin)
+        where = USER_LISTS[kind]
+        params: List[object] = []
+        if cursor is not None:
+            where += f" AND (registered_at, id) {'>' if backward else '<'} (SELECT registered_at, id FROM users WHERE id = ?)"
+            params.append(cursor)
+        order = "ASC" if backward else "DESC"
+        params.append(limit + 1)
+        async with self.reader() as conn:
+            cur = await conn.execute(
+                f"SELECT id, tg_id, username, registered_at, blocked, is_admin FROM users WHERE {where} "
+                f"ORDER BY registered_at {order}, id {order} LIMIT ?",
+                params,
+            )
+            rows = list(await cur.fetchall())
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+            return UserPage(rows, has_prev=more, has_next=True)
+        return UserPage(rows, has_prev=cursor is not None, has_next=more)
+
     async def get_all_users(self, limit: int = 100) -> List[tuple]:
-        conn = await self.get_connection()
-        cur = await conn.execute("SELECT tg_id, username, registered_at, blocked, is_admin FROM users ORDER BY registered_at DESC LIMIT ?", (limit,))
-        return await cur.fetchall()
+        async with self.reader() as conn:
+            cur = await conn.execute("SELECT tg_id, username, registered_at, blocked, is_admin FROM users ORDER BY registered_at DESC LIMIT ?", (limit,))
+            return await cur.fetchall()
+
+    async def export_users_csv(self, file_path: str, compress: bool = False, chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+        # Соединение на чтение держит один снимок WAL на всё время выгрузки и не мешает записи
+        async with self.reader() as conn:
+            return await stream_csv(
+                conn,
+                f"SELECT {', '.join(EXPORT_COLUMNS)} FROM users ORDER BY id DESC",
+                EXPORT_COLUMNS,
+                file_path,
+                compress=compress,
+                chunk_size=chunk_size,
+            )
 
     async def get_blocked_users(self) -> List[tuple]:
-        conn = await self.get_connection()
-        cur = await conn.execute("SELECT tg_id, username, registered_at FROM users WHERE blocked = 1")
-        return await cur.fetchall()
+        async with self.reader() as conn:
+            cur = await conn.execute("SELECT tg_id, username, registered_at FROM users WHERE blocked = 1")
+            return await cur.fetchall()
 
     async def get_recent_users(self, days: int = 1) -> int:
-        conn = await self.get_connection()
-        cur = await conn.execute("SELECT COUNT(*) FROM users WHERE registered_at >= datetime('now', ?)", (f"-{days} days",))
-        return (await cur.fetchone())[0]
+        async with self.reader() as conn:
+            cur = await conn.execute("SELECT COUNT(*) FROM users WHERE registered_at >= datetime('now', ?)", (f"-{days} days",))
+            return (await cur.fetchone())[0]
+
+    async def expire_searches(self, tg_ids: Iterable[int], still_expired: Callable[[int], bool] = lambda tg_id: True) -> List[int]:
+        # Снятие просроченных поисков одной транзакцией. still_expired проверяется уже под блокировкой записи:
+        # кто успел снова нажать «Поиск», не трогается, и его отложенная запись не теряется
+        async with self.writer() as conn:
+            expired = [tg_id for tg_id in tg_ids if still_expired(tg_id)]
+            for tg_id in expired:
+                self.write_behind.discard(("in_search", tg_id))
+            for start in range(0, len(expired), USERS_BATCH_SIZE):
+                chunk = expired[start:start + USERS_BATCH_SIZE]
+                await conn.execute(
+                    f"UPDATE users SET in_search = 0, search_started_at = NULL WHERE tg_id IN ({', '.join('?' * len(chunk))}) AND in_search = 1",
+                    chunk,
+                )
+        return expired
 
     async def set_in_search_all(self, in_search: bool):
-        conn = await self.get_connection()
-        await conn.execute("UPDATE users SET in_search = ?", (1 if in_search else 0,))
-        await conn.commit()
+        async with self.writer() as conn:
+            self.write_behind.discard_kind("in_search")
+            await conn.execute(
+                "UPDATE users SET in_search = ?, search_started_at = CASE WHEN ? THEN COALESCE(search_started_at, ?) END",
+                (1 if in_search else 0, 1 if in_search else 0, time.time()),
+            )
 
     async def set_admin(self, tg_id: int, is_admin: bool) -> None:
-        conn = await self.get_connection()
-        await conn.execute("UPDATE users SET is_admin = ? WHERE tg_id = ?", (1 if is_admin else 0, tg_id))
-        await conn.commit()
+        async with self.writer() as conn:
+            await conn.execute("UPDATE users SET is_admin = ? WHERE tg_id = ?", (1 if is_admin else 0, tg_id))
+        self.cache.update(tg_id, is_admin=is_admin)
+
+    async def create_broadcast(self, created_by: int, from_chat_id: int, message_id: int, progress_chat_id: int, progress_message_id: int) -> Broadcast:
+        async with self.writer() as conn:
+            cur = await conn.execute(
+                "INSERT INTO broadcasts (created_by, from_chat_id, message_id, progress_chat_id, progress_message_id, total) "
+                "VALUES (?, ?, ?, ?, ?, (SELECT COUNT(*) FROM users WHERE unreachable = 0 AND (blocked IS NULL OR blocked = 0)))",
+                (created_by, from_chat_id, message_id, progress_chat_id, progress_message_id),
+            )
+            cur = await conn.execute(f"SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE id = ?", (cur.lastrowid,))
+            return Broadcast(*await cur.fetchone())
+
+    async def list_running_broadcasts(self) -> List[Broadcast]:
+        async with self.reader() as conn:
+            cur = await conn.execute(f"SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE status = 'running' ORDER BY id")
+            return [Broadcast(*row) for row in await cur.fetchall()]
+
+    async def broadcast_recipients(self, after: int, limit: int) -> List[int]:
+        # Страница получателей по tg_id: курсор рассылки и есть последний обработанный tg_id
+        async with self.reader() as conn:
+            cur = await conn.execute(
+                "SELECT tg_id FROM users WHERE tg_id > ? AND unreachable = 0 AND (blocked IS NULL OR blocked = 0) ORDER BY tg_id LIMIT ?",
+                (after, limit),
+            )
+            return [int(row[0]) for row in await cur.fetchall()]
+
+    async def checkpoint_broadcast(self, broadcast_id: int, cursor: int, sent: int, failed: int, unreachable: List[int]) -> None:
+        # Прогресс страницы и отметки недоступных пишутся одной транзакцией
+        async with self.writer() as conn:
+            await conn.execute(
+                "UPDATE broadcasts SET cursor = ?, sent = sent + ?, failed = failed + ?, unreachable = unreachable + ? WHERE id = ?",
+                (cursor, sent, failed, len(unreachable), broadcast_id),
+            )
+            if unreachable:
+                await conn.executemany("UPDATE users SET unreachable = 1 WHERE tg_id = ?", [(tg_id,) for tg_id in unreachable])
+        for tg_id in unreachable:
+            self._known_users.pop(tg_id, None)
+
+    async def finish_broadcast(self, broadcast_id: int, status: str) -> None:
+        async with self.writer() as conn:
+            await conn.execute(
+                "UPDATE broadcasts SET status = ?, finished_at = datetime('now') WHERE id = ? AND status = 'running'",
+                (status, broadcast_id),
+            )
 
     async def get_admins(self) -> List[int]:
-        conn = await self.get_connection()
-        cur = await conn.execute("SELECT tg_id FROM users WHERE is_admin = 1")
-        return [int(row[0]) for row in await cur.fetchall()]
\ No newline at end of file
+        async with self.reader() as conn:
+            cur = await conn.execute("SELECT tg_id FROM users WHERE is_admin = 1")
+            return [int(row[0]) for row in await cur.fetchall()]
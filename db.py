@@ -2,10 +2,12 @@ import aiosqlite
 
 import asyncio
 
-import csv
-
 from typing import Optional, Tuple, List, Dict, Set
 
+from migrations import migrate
+
+from database import stream_csv
+
 
 
 
@@ -38,55 +40,7 @@ class Database:
 
 		async with aiosqlite.connect(self.path) as db:
 
-			await db.execute(
-
-				"""
-
-				CREATE TABLE IF NOT EXISTS users (
-
-					id INTEGER PRIMARY KEY AUTOINCREMENT,
-
-					tg_id INTEGER UNIQUE NOT NULL,
-
-					username TEXT,
-
-					registered_at TEXT DEFAULT (datetime('now')),
-
-					in_search INTEGER DEFAULT 0,
-
-					partner_tg_id INTEGER
-
-				)
-
-				"""
-
-			)
-
-			# Best-effort migrations
-
-			for sql in [
-
-				"ALTER TABLE users ADD COLUMN blocked INTEGER DEFAULT 0",
-
-				"ALTER TABLE users ADD COLUMN gender TEXT",
-
-				"ALTER TABLE users ADD COLUMN seeking_gender TEXT",
-
-				"ALTER TABLE users ADD COLUMN age INTEGER",
-
-				"ALTER TABLE users ADD COLUMN interests TEXT",
-
-			]:
-
-				try:
-
-					await db.execute(sql)
-
-				except Exception:
-
-					pass
-
-			await db.commit()
+			await migrate(db)
 
 
 
@@ -502,23 +456,23 @@ class Database:
 
 
 
-	async def export_csv(self, file_path: str = "export_users.csv") -> str:
+	async def export_csv(self, file_path: str = "export_users.csv", compress: bool = False) -> str:
 
 		async with aiosqlite.connect(self.path) as db:
 
-			cur = await db.execute("SELECT tg_id, username, registered_at, in_search, partner_tg_id, blocked, gender, seeking_gender, age, interests FROM users ORDER BY id DESC")
+			await stream_csv(
 
-			rows = await cur.fetchall()
+				db,
 
-		with open(file_path, "w", newline="", encoding="utf-8") as f:
+				"SELECT tg_id, username, registered_at, in_search, partner_tg_id, blocked, gender, seeking_gender, age, interests FROM users ORDER BY id DESC",
 
-			writer = csv.writer(f)
+				["tg_id", "username", "registered_at", "in_search", "partner_tg_id", "blocked", "gender", "seeking_gender", "age", "interests"],
 
-			writer.writerow(["tg_id", "username", "registered_at", "in_search", "partner_tg_id", "blocked", "gender", "seeking_gender", "age", "interests"])
+				file_path,
 
-			for r in rows:
+				compress=compress,
 
-				writer.writerow(r)
+			)
 
 		return file_path
 
@@ -1,9 +1,10 @@
 # keyboards.py
+from typing import Optional
 from aiogram.types import (
     ReplyKeyboardMarkup, KeyboardButton, 
     InlineKeyboardMarkup, InlineKeyboardButton
 )
-from config import REACTION_CHOICES, REPORT_REASONS
+from config import REACTION_CHOICES, REPORT_REASONS, GENDER_CHOICES, SEEKING_ANY
 
 def build_main_keyboard(is_admin: bool = False) -> ReplyKeyboardMarkup:
     keyboard = [
@@ -23,28 +24,55 @@ def build_main_keyboard(is_admin: bool = False) -> ReplyKeyboardMarkup:
 def build_profile_settings_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
-            [KeyboardButton(text="📄 Мой профиль"), KeyboardButton(text="🔙 В главное меню")],
+            [KeyboardButton(text="📄 Мой профиль"), KeyboardButton(text="🎯 Интересы")],
+            [KeyboardButton(text="👤 Пол"), KeyboardButton(text="💘 Кого ищу")],
+            [KeyboardButton(text="🎂 Возраст"), KeyboardButton(text="🔙 В главное меню")],
         ],
         resize_keyboard=True,
         one_time_keyboard=False,
     )
 
+def build_cancel_keyboard() -> ReplyKeyboardMarkup:
+    # Пока бот ждёт ввода, под рукой только отмена — иначе нажатая кнопка меню ушла бы как ответ
+    return ReplyKeyboardMarkup(
+        keyboard=[[KeyboardButton(text="❌ Отмена")]],
+        resize_keyboard=True,
+        one_time_keyboard=False,
+    )
+
 def build_admin_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text="📊 Статистика"), KeyboardButton(text="👥 Все пользователи")],
             [KeyboardButton(text="🔍 В поиске"), KeyboardButton(text="💬 Диалоги")],
             [KeyboardButton(text="🚫 Заблокированные"), KeyboardButton(text="📝 Жалобы")],
+            [KeyboardButton(text="📤 Экспорт"), KeyboardButton(text="📣 Рассылка")],
             [KeyboardButton(text="🔙 В главное меню")],
         ],
         resize_keyboard=True,
         one_time_keyboard=False,
     )
 
-def build_reactions_keyboard() -> InlineKeyboardMarkup:
+def build_page_keyboard(kind: str, first_id: int, last_id: int, has_prev: bool, has_next: bool) -> Optional[InlineKeyboardMarkup]:
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"admin_page:{kind}:prev:{first_id}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"admin_page:{kind}:next:{last_id}"))
+    if not buttons:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+def build_gender_keyboard(action: str, with_any: bool = False) -> InlineKeyboardMarkup:
+    buttons = [InlineKeyboardButton(text=label, callback_data=f"{action}:{value}") for label, value in GENDER_CHOICES]
+    if with_any:
+        buttons.append(InlineKeyboardButton(text="🤷 Неважно", callback_data=f"{action}:{SEEKING_ANY}"))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+def build_reactions_keyboard(partner_id: int) -> InlineKeyboardMarkup:
     buttons = [
-        InlineKeyboardButton(text="👍", callback_data="react:like"),
-        InlineKeyboardButton(text="👎", callback_data="react:dislike")
+        InlineKeyboardButton(text="👍", callback_data=f"react:like:{partner_id}"),
+        InlineKeyboardButton(text="👎", callback_data=f"react:dislike:{partner_id}")
     ]
     return InlineKeyboardMarkup(inline_keyboard=[buttons])
 
@@ -4,6 +4,13 @@ from aiogram import Bot, Dispatcher
 
 from config import BOT_TOKEN
 from database import Database
+from matchmaking import Matchmaker
+from middlewares import UserContextMiddleware
+from outbound import Outbox
+from broadcast import Broadcaster
+from relay import AlbumBuffer
+from notifications import AdminNotifier
+from sweepers import IdleDialogSweeper, SearchSweeper
 from profile_handlers import router as profile_router
 from chat_handlers import router as chat_router
 from admin_handlers import router as admin_router
@@ -14,7 +21,21 @@ async def main():
         raise RuntimeError("BOT_TOKEN не задан")
     
     bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher()
+    # Одна база и один матчмейкер на всё приложение — попадают в хендлеры через workflow data
+    db = Database()
+    matchmaker = Matchmaker(db)
+    # Все исходящие уведомления и пересылки идут через общую очередь с ограничением частоты
+    outbox = Outbox(bot)
+    broadcaster = Broadcaster(outbox, db)
+    # Уведомления админам: одно сообщение всем сразу, реакции — периодической сводкой
+    admin_notifier = AdminNotifier(outbox)
+    # Части альбомов копятся здесь и уходят собеседнику одним send_media_group
+    albums = AlbumBuffer()
+    dp = Dispatcher(db=db, matchmaker=matchmaker, outbox=outbox, broadcaster=broadcaster, admin_notifier=admin_notifier, albums=albums)
+    # Состояние автора апдейта собирается один раз и передаётся в хендлеры как user_ctx
+    user_context = UserContextMiddleware(db, matchmaker)
+    dp.message.outer_middleware(user_context)
+    dp.callback_query.outer_middleware(user_context)
     
     # Подключаем роутеры в правильном порядке
     dp.include_router(profile_router)
@@ -22,8 +43,16 @@ async def main():
     dp.include_router(admin_router)
     dp.include_router(reaction_router)
     
-    db = Database()
     await db.init()
+    await matchmaker.load()
+    outbox.start()
+    search_sweeper = SearchSweeper(outbox, db, matchmaker)
+    search_sweeper.start()
+    idle_sweeper = IdleDialogSweeper(outbox, db)
+    idle_sweeper.start()
+    admin_notifier.start()
+    # Рассылка, прерванная прошлой остановкой, продолжается с сохранённого места
+    await broadcaster.resume()
 
     print("🎓 Школьный чат запущен! Нажмите Ctrl+C для остановки")
     
@@ -32,6 +61,16 @@ async def main():
     except Exception as e:
         print(f"❌ Критическая ошибка: {e}")
     finally:
+        await search_sweeper.stop()
+        await idle_sweeper.stop()
+        await broadcaster.stop()
+        # Недосланная сводка реакций уходит до остановки очереди
+        await admin_notifier.stop()
+        # Недособранные альбомы отправляем, пока сессия бота открыта
+        await albums.drain()
+        await outbox.stop()
+        # Сбрасываем отложенные записи до закрытия соединений
+        await db.flush()
         await db.close()
         await bot.session.close()
 
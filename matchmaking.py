@@ -0,0 +1,330 @@
+import bisect
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from config import (
+    GENDER_CHOICES, MATCH_MAX_WAIT, MATCH_WEIGHTS, RECENT_PARTNERS_FALLBACK, RECENT_PARTNERS_LIMIT, RECENT_PARTNERS_TTL,
+    SEARCH_TIMEOUT, SWEEP_TICK,
+)
+from database import Database, UserState, WaitingUser
+from scoring import CandidatePool, Features, InterestVocabulary, ScoringWeights
+from timing_wheel import TimingWheel
+
+GENDERS = tuple(value for _, value in GENDER_CHOICES)
+
+BucketKey = Tuple[Optional[str], Optional[str]]
+
+def bucket_key(gender: Optional[str], seeking_gender: Optional[str]) -> BucketKey:
+    # Неизвестный пол и «неважно» сводятся к None
+    return (gender if gender in GENDERS else None, seeking_gender if seeking_gender in GENDERS else None)
+
+def compatible(a: BucketKey, b: BucketKey) -> bool:
+    # Совместимость взаимная: каждый подходит под то, кого ищет другой
+    return (a[1] is None or a[1] == b[0]) and (b[1] is None or b[1] == a[0])
+
+BUCKET_KEYS: List[BucketKey] = [(g, s) for g in (None,) + GENDERS for s in (None,) + GENDERS]
+COMPATIBLE_BUCKETS: Dict[BucketKey, List[BucketKey]] = {
+    key: [other for other in BUCKET_KEYS if compatible(key, other)] for key in BUCKET_KEYS
+}
+
+
+class RecentPartners:
+    # Для каждого пользователя — последние limit собеседников со сроком годности: старые записи вытесняются
+    # по размеру, просроченные удаляются при обращении. Исключение кандидата из пула — поиск слота в словаре.
+    # fallback — через сколько секунд ожидания исключение снимается (0 — не снимается)
+    def __init__(self, limit: int = RECENT_PARTNERS_LIMIT, ttl: float = RECENT_PARTNERS_TTL, fallback: float = RECENT_PARTNERS_FALLBACK) -> None:
+        self.limit = limit
+        self.ttl = ttl
+        self.fallback = fallback
+        self._recent: Dict[int, "OrderedDict[int, float]"] = {}
+        self._next_prune = time.monotonic() + ttl
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def _remember(self, tg_id: int, partner_tg_id: int, expires: float) -> None:
+        recent = self._recent.setdefault(tg_id, OrderedDict())
+        recent.pop(partner_tg_id, None)
+        recent[partner_tg_id] = expires
+        while len(recent) > self.limit:
+            recent.popitem(last=False)
+
+    def record(self, a: int, b: int) -> None:
+        if self.limit <= 0:
+            return
+        now = time.monotonic()
+        if now >= self._next_prune:
+            self.prune(now)
+        expires = now + self.ttl
+        self._remember(a, b, expires)
+        self._remember(b, a, expires)
+
+    def prune(self, now: Optional[float] = None) -> None:
+        # Раз в ttl убираем пользователей, у которых истекла даже самая свежая запись
+        now = time.monotonic() if now is None else now
+        for tg_id in [tg_id for tg_id, recent in self._recent.items() if next(reversed(recent.values())) <= now]:
+            del self._recent[tg_id]
+        self._next_prune = now + self.ttl
+
+    def partners_of(self, tg_id: int) -> List[int]:
+        recent = self._recent.get(tg_id)
+        if not recent:
+            return []
+        now = time.monotonic()
+        # Записи добавляются по времени, поэтому просроченные всегда в начале
+        while recent and next(iter(recent.values())) <= now:
+            recent.popitem(last=False)
+        if not recent:
+            del self._recent[tg_id]
+            return []
+        return list(recent)
+
+
+def _wait_bounds(first: float = 0.5, factor: float = 1.25, last: float = 86400) -> List[float]:
+    bounds = [first]
+    while bounds[-1] < last:
+        bounds.append(bounds[-1] * factor)
+    return bounds
+
+
+class WaitHistogram:
+    # Потоковая гистограмма времени ожидания: логарифмические интервалы от полсекунды до суток,
+    # память постоянна, перцентиль интерполируется внутри интервала
+    BOUNDS = _wait_bounds()
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.BOUNDS[i - 1] if i else 0.0
+                upper = self.BOUNDS[i] if i < len(self.BOUNDS) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+
+class SearchBucket:
+    # Ожидающие с одинаковой парой (пол, кого ищет): свой пул признаков для оценки и время ожидания
+    def __init__(self, key: BucketKey) -> None:
+        self.key = key
+        self.pool = CandidatePool()
+        self.waits = WaitHistogram()
+
+    def __len__(self) -> int:
+        return len(self.pool)
+
+
+class WaitingEntry(NamedTuple):
+    bucket: BucketKey
+    features: Features
+    since: float
+
+
+class BucketStats(NamedTuple):
+    key: BucketKey
+    waiting: int
+    matched: int
+    p50: float
+    p95: float
+    max_wait: float
+    oldest_wait: float
+
+
+class Matchmaker:
+    def __init__(self, db: Database, weights: Optional[ScoringWeights] = None, max_wait: Optional[float] = MATCH_MAX_WAIT, search_timeout: float = SEARCH_TIMEOUT) -> None:
+        self.db = db
+        self.max_wait = max_wait
+        self.search_timeout = search_timeout
+        # Сроки поисков: одно колесо таймеров на всех вместо задачи на пользователя
+        self.expiry = TimingWheel(tick=SWEEP_TICK)
+        self.expired = 0
+        # Веса можно подменить на лету: следующий поиск уже считается с новыми
+        self.weights = weights or ScoringWeights(**MATCH_WEIGHTS)
+        self.vocabulary = InterestVocabulary()
+        self.recent = RecentPartners()
+        self.waits = WaitHistogram()
+        self.buckets: Dict[BucketKey, SearchBucket] = {key: SearchBucket(key) for key in BUCKET_KEYS}
+        self._waiting: Dict[int, WaitingEntry] = {}
+
+    def __len__(self) -> int:
+        return len(self._waiting)
+
+    def __contains__(self, tg_id: int) -> bool:
+        return tg_id in self._waiting
+
+    def _features(self, state: Optional[Union[UserState, WaitingUser]]) -> Tuple[BucketKey, Features]:
+        if state is None:
+            return (None, None), self.vocabulary.features(None, (), 0)
+        return (
+            bucket_key(state.gender, state.seeking_gender),
+            self.vocabulary.features(state.age, state.interests, state.reputation),
+        )
+
+    async def load(self) -> None:
+        for bucket in self.buckets.values():
+            bucket.pool.clear()
+        self._waiting.clear()
+        # Время ожидания переживает перезапуск: unix-время начала поиска переводится в монотонные часы
+        now = time.monotonic()
+        wall = time.time()
+        for user in await self.db.list_waiting():
+            key, features = self._features(user)
+            waited = max(0.0, wall - user.search_started_at) if user.search_started_at else 0.0
+            self._enqueue(user.tg_id, key, features, since=now - waited)
+            self.expiry.schedule(user.tg_id, now - waited + self.search_timeout)
+
+    def _enqueue(self, tg_id: int, key: BucketKey, features: Features, since: Optional[float] = None) -> None:
+        entry = self._waiting.get(tg_id)
+        if entry is not None:
+            # Повторный поиск или смена профиля во время ожидания: время ожидания сохраняется
+            since = entry.since if since is None else since
+            if entry.bucket != key:
+                self._dequeue(tg_id)
+        if since is None:
+            since = time.monotonic()
+        self.buckets[key].pool.add(tg_id, features, since)
+        self._waiting[tg_id] = WaitingEntry(key, features, since)
+
+    def _dequeue(self, tg_id: int) -> Optional[WaitingEntry]:
+        entry = self._waiting.pop(tg_id, None)
+        if entry is not None:
+            self.buckets[entry.bucket].pool.discard(tg_id)
+            self.expiry.cancel(tg_id)
+        return entry
+
+    def _pick_partner(self, tg_id: int, key: BucketKey, features: Features) -> Optional[int]:
+        # Смотрим только совместимые корзины; внутри каждой пул оценивается целиком одним векторным проходом
+        # Недавние собеседники исключаются, чтобы «Следующий» не возвращал того, от кого только что ушли,
+        # но ищущий дольше recent.fallback уже согласен и на них — иначе двое последних ждали бы друг друга до таймаута.
+        # Кто ждёт дольше max_wait, обгоняет всех по оценке: среди таких побеждает самый давно ждущий
+        now = time.monotonic()
+        recent = [] if self._recent_allowed(tg_id, now) else self.recent.partners_of(tg_id)
+        best: Optional[Tuple[Tuple[bool, float], int]] = None
+        for other in COMPATIBLE_BUCKETS[key]:
+            match = self.buckets[other].pool.best(tg_id, features, self.weights, now, exclude=recent, max_wait=self.max_wait)
+            if match is None:
+                continue
+            candidate, score, since = match
+            overdue = self.max_wait is not None and since <= now - self.max_wait
+            rank = (overdue, -since if overdue else score)
+            if best is None or rank > best[0]:
+                best = (rank, candidate)
+        return best[1] if best else None
+
+    def _recent_allowed(self, tg_id: int, now: float) -> bool:
+        entry = self._waiting.get(tg_id)
+        return entry is not None and self.recent.fallback > 0 and entry.since <= now - self.recent.fallback
+
+    async def rematch(self) -> List[Tuple[int, int]]:
+        # Пара для ожидающего не нашлась сразу только из-за исключения недавних собеседников (остальных search
+        # подобрал бы). Когда такой ожидающий ждёт дольше recent.fallback, пробуем ещё раз — уже без исключения
+        now = time.monotonic()
+        pairs = []
+        overdue = [tg_id for tg_id in self._waiting if self._recent_allowed(tg_id, now) and self.recent.partners_of(tg_id)]
+        for tg_id in overdue:
+            entry = self._waiting.get(tg_id)
+            if entry is None:
+                continue
+            partner_tg_id = self._pick_partner(tg_id, entry.bucket, entry.features)
+            if partner_tg_id is None:
+                continue
+            # Оба остаются в очереди до записи пары: если её перехватит параллельный поиск, pair_users откажет
+            if await self.db.pair_users(tg_id, partner_tg_id):
+                now = time.monotonic()
+                for paired in (tg_id, partner_tg_id):
+                    paired_entry = self._dequeue(paired)
+                    if paired_entry is not None:
+                        self._record_wait(paired_entry.bucket, now - paired_entry.since)
+                self.recent.record(tg_id, partner_tg_id)
+                pairs.append((tg_id, partner_tg_id))
+        return pairs
+
+    async def search(self, tg_id: int) -> Optional[int]:
+        key, features = self._features(await self.db.get_user_state(tg_id))
+        # Начало ожидания запоминается до первой попытки: после неудачной пары ищущий возвращается в очередь
+        # со своим временем, а не встаёт за более новыми
+        since: Optional[float] = None
+        while True:
+            # Подбор пары целиком в памяти, без await между выбором и постановкой в очередь — гонок нет
+            partner_tg_id = self._pick_partner(tg_id, key, features)
+            if partner_tg_id is None:
+                self._enqueue(tg_id, key, features, since=since)
+                # Срок считается от последнего нажатия «Поиск»: повторный поиск его продлевает
+                self.expiry.schedule(tg_id, time.monotonic() + self.search_timeout)
+                await self.db.set_in_search(tg_id, True)
+                return None
+            partner = self._dequeue(partner_tg_id)
+            own = self._dequeue(tg_id)
+            if own is not None:
+                since = own.since
+            if await self.db.pair_users(tg_id, partner_tg_id):
+                now = time.monotonic()
+                self._record_wait(partner.bucket, now - partner.since)
+                self._record_wait(key, now - since if since is not None else 0.0)
+                self.recent.record(tg_id, partner_tg_id)
+                return partner_tg_id
+            # Пара не записалась: если занят сам ищущий — кандидат возвращается в пул со своим временем ожидания,
+            # иначе кандидат уже неактуален и берём следующего
+            if self.db.partners.get(tg_id) is not None or await self.db.is_blocked(tg_id):
+                self._enqueue(partner_tg_id, partner.bucket, partner.features, since=partner.since)
+                self.expiry.schedule(partner_tg_id, time.monotonic() + self.search_timeout)
+                return None
+
+    def _record_wait(self, key: BucketKey, seconds: float) -> None:
+        self.buckets[key].waits.record(seconds)
+        self.waits.record(seconds)
+
+    async def refresh(self, tg_id: int) -> None:
+        # Профиль или репутация изменились во время ожидания: обновляем признаки и при необходимости корзину
+        if tg_id not in self._waiting:
+            return
+        state = await self.db.get_user_state(tg_id)
+        if state is None or tg_id not in self._waiting:
+            return
+        key, features = self._features(state)
+        self._enqueue(tg_id, key, features)
+
+    def bucket_stats(self) -> List[BucketStats]:
+        now = time.monotonic()
+        stats = []
+        for key, bucket in self.buckets.items():
+            if not bucket and not bucket.waits.count:
+                continue
+            oldest = bucket.pool.oldest()
+            stats.append(BucketStats(
+                key, len(bucket), bucket.waits.count, bucket.waits.percentile(0.5), bucket.waits.percentile(0.95),
+                bucket.waits.max, now - oldest if oldest is not None else 0.0,
+            ))
+        return stats
+
+    async def expire(self, now: Optional[float] = None) -> List[int]:
+        # Снимает поиски с истёкшим сроком: из памяти сразу, из базы — одной пачкой
+        expired = [tg_id for tg_id in self.expiry.advance(now) if tg_id in self._waiting]
+        for tg_id in expired:
+            self._dequeue(tg_id)
+        if not expired:
+            return []
+        expired = await self.db.expire_searches(expired, lambda tg_id: tg_id not in self._waiting)
+        self.expired += len(expired)
+        return expired
+
+    async def cancel(self, tg_id: int) -> None:
+        self._dequeue(tg_id)
+        await self.db.set_in_search(tg_id, False)
+
+    def forget(self, tg_id: int) -> None:
+        self._dequeue(tg_id)
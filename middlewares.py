@@ -0,0 +1,55 @@
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from config import ADMIN_IDS, DEVELOPER_ID
+from database import Database
+from matchmaking import Matchmaker
+
+
+class UserContext(NamedTuple):
+    tg_id: int
+    blocked: bool
+    is_admin: bool
+    partner: Optional[int]
+    in_search: bool
+
+
+async def is_admin(db: Database, tg_id: int) -> bool:
+    # Для остальных пользователей (собеседник, получатели уведомлений); про автора апдейта это уже знает UserContext
+    if tg_id == DEVELOPER_ID or tg_id in ADMIN_IDS:
+        return True
+    return await db.is_admin(tg_id)
+
+
+async def load_user_context(db: Database, matchmaker: Matchmaker, tg_id: int) -> UserContext:
+    # Флаги берутся из кэша состояний (в БД — только при промахе), собеседник и поиск — из памяти
+    state = await db.get_user_state(tg_id)
+    return UserContext(
+        tg_id=tg_id,
+        blocked=bool(state and state.blocked),
+        is_admin=tg_id == DEVELOPER_ID or tg_id in ADMIN_IDS or bool(state and state.is_admin),
+        partner=db.partners.get(tg_id),
+        in_search=tg_id in matchmaker,
+    )
+
+
+class UserContextMiddleware(BaseMiddleware):
+    # Внешний middleware: состояние автора апдейта собирается один раз до фильтров и попадает в хендлеры как user_ctx.
+    # Апдейты без автора дальше не идут — хендлерам без пользователя делать нечего
+    def __init__(self, db: Database, matchmaker: Matchmaker) -> None:
+        self.db = db
+        self.matchmaker = matchmaker
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is None:
+            return None
+        data["user_ctx"] = await load_user_context(self.db, self.matchmaker, user.id)
+        return await handler(event, data)
@@ -0,0 +1,224 @@
+import aiosqlite
+from typing import Awaitable, Callable, List, Set, Tuple
+
+
+async def _columns(conn: aiosqlite.Connection, table: str) -> Set[str]:
+    cur = await conn.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in await cur.fetchall()}
+
+
+async def _add_columns(conn: aiosqlite.Connection, table: str, columns: List[Tuple[str, str]]) -> None:
+    existing = await _columns(conn, table)
+    for name, decl in columns:
+        if name not in existing:
+            await conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+async def _v1_users(conn: aiosqlite.Connection) -> None:
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tg_id INTEGER UNIQUE NOT NULL,
+            username TEXT,
+            registered_at TEXT DEFAULT (datetime('now')),
+            in_search INTEGER DEFAULT 0,
+            partner_tg_id INTEGER,
+            blocked INTEGER DEFAULT 0,
+            is_admin INTEGER DEFAULT 0
+        )
+        """
+    )
+
+
+async def _v2_legacy_columns(conn: aiosqlite.Connection) -> None:
+    # Базы, созданные старым db.py, могут не иметь части колонок — добавляем недостающие
+    await _add_columns(conn, "users", [
+        ("blocked", "INTEGER DEFAULT 0"),
+        ("is_admin", "INTEGER DEFAULT 0"),
+        ("gender", "TEXT"),
+        ("seeking_gender", "TEXT"),
+        ("age", "INTEGER"),
+        ("interests", "TEXT"),
+    ])
+
+
+async def _v3_user_indexes(conn: aiosqlite.Connection) -> None:
+    # Частичные индексы под выборки поиска, диалогов, блокировок и админов
+    for sql in [
+        "CREATE INDEX IF NOT EXISTS idx_users_registered ON users(registered_at)",
+        "CREATE INDEX IF NOT EXISTS idx_users_searching ON users(registered_at) WHERE in_search = 1",
+        "CREATE INDEX IF NOT EXISTS idx_users_partner ON users(partner_tg_id) WHERE partner_tg_id IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS idx_users_blocked ON users(registered_at) WHERE blocked = 1",
+        "CREATE INDEX IF NOT EXISTS idx_users_admins ON users(tg_id) WHERE is_admin = 1",
+    ]:
+        await conn.execute(sql)
+
+
+async def _v4_user_counters(conn: aiosqlite.Connection) -> None:
+    # Счётчики для статистики поддерживаются триггерами, чтобы не делать COUNT(*) по всей таблице
+    await conn.execute("CREATE TABLE IF NOT EXISTS user_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)")
+    await conn.execute(
+        """
+        INSERT OR REPLACE INTO user_counters (name, value) VALUES
+            ('total', (SELECT COUNT(*) FROM users)),
+            ('searching', (SELECT COUNT(*) FROM users WHERE in_search = 1)),
+            ('in_dialog', (SELECT COUNT(*) FROM users WHERE partner_tg_id IS NOT NULL)),
+            ('blocked', (SELECT COUNT(*) FROM users WHERE blocked = 1)),
+            ('admins', (SELECT COUNT(*) FROM users WHERE is_admin = 1))
+        """
+    )
+    await conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS users_counters_insert AFTER INSERT ON users BEGIN
+            UPDATE user_counters SET value = value + CASE name
+                WHEN 'total' THEN 1
+                WHEN 'searching' THEN COALESCE(NEW.in_search, 0) = 1
+                WHEN 'in_dialog' THEN NEW.partner_tg_id IS NOT NULL
+                WHEN 'blocked' THEN COALESCE(NEW.blocked, 0) = 1
+                WHEN 'admins' THEN COALESCE(NEW.is_admin, 0) = 1
+                ELSE 0 END;
+        END
+        """
+    )
+    await conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS users_counters_delete AFTER DELETE ON users BEGIN
+            UPDATE user_counters SET value = value - CASE name
+                WHEN 'total' THEN 1
+                WHEN 'searching' THEN COALESCE(OLD.in_search, 0) = 1
+                WHEN 'in_dialog' THEN OLD.partner_tg_id IS NOT NULL
+                WHEN 'blocked' THEN COALESCE(OLD.blocked, 0) = 1
+                WHEN 'admins' THEN COALESCE(OLD.is_admin, 0) = 1
+                ELSE 0 END;
+        END
+        """
+    )
+    # Срабатывает только когда меняется хотя бы один из учитываемых признаков
+    await conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS users_counters_update AFTER UPDATE OF in_search, partner_tg_id, blocked, is_admin ON users
+        WHEN (COALESCE(OLD.in_search, 0) = 1) != (COALESCE(NEW.in_search, 0) = 1)
+            OR (OLD.partner_tg_id IS NULL) != (NEW.partner_tg_id IS NULL)
+            OR (COALESCE(OLD.blocked, 0) = 1) != (COALESCE(NEW.blocked, 0) = 1)
+            OR (COALESCE(OLD.is_admin, 0) = 1) != (COALESCE(NEW.is_admin, 0) = 1)
+        BEGIN
+            UPDATE user_counters SET value = value + CASE name
+                WHEN 'searching' THEN (COALESCE(NEW.in_search, 0) = 1) - (COALESCE(OLD.in_search, 0) = 1)
+                WHEN 'in_dialog' THEN (NEW.partner_tg_id IS NOT NULL) - (OLD.partner_tg_id IS NOT NULL)
+                WHEN 'blocked' THEN (COALESCE(NEW.blocked, 0) = 1) - (COALESCE(OLD.blocked, 0) = 1)
+                WHEN 'admins' THEN (COALESCE(NEW.is_admin, 0) = 1) - (COALESCE(OLD.is_admin, 0) = 1)
+                ELSE 0 END
+            WHERE name != 'total';
+        END
+        """
+    )
+
+
+async def _v5_reputation(conn: aiosqlite.Connection) -> None:
+    # Репутация = лайки минус дизлайки от собеседников, участвует в оценке кандидатов при подборе
+    await _add_columns(conn, "users", [("reputation", "INTEGER NOT NULL DEFAULT 0")])
+
+
+async def _v6_search_started_at(conn: aiosqlite.Connection) -> None:
+    # Время постановки в поиск (unix-время): по нему считается ожидание и восстанавливается очередь после перезапуска
+    await _add_columns(conn, "users", [("search_started_at", "REAL")])
+    await conn.execute("UPDATE users SET search_started_at = strftime('%s', 'now') WHERE in_search = 1 AND search_started_at IS NULL")
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_users_search_started ON users(search_started_at) WHERE in_search = 1")
+
+
+async def _v7_last_activity(conn: aiosqlite.Connection) -> None:
+    # Последняя активность в диалоге (unix-время): пишется с прореживанием, по ней завершаются простаивающие диалоги
+    await _add_columns(conn, "users", [("last_activity_at", "REAL")])
+    await conn.execute("UPDATE users SET last_activity_at = strftime('%s', 'now') WHERE partner_tg_id IS NOT NULL AND last_activity_at IS NULL")
+
+
+async def _v8_broadcasts(conn: aiosqlite.Connection) -> None:
+    # Рассылки с контрольной точкой: после перезапуска продолжаются с последнего обработанного tg_id.
+    # unreachable — пользователь заблокировал бота, рассылки его пропускают, пока он снова не напишет
+    await _add_columns(conn, "users", [("unreachable", "INTEGER NOT NULL DEFAULT 0")])
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_by INTEGER NOT NULL,
+            created_at TEXT DEFAULT (datetime('now')),
+            from_chat_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            progress_chat_id INTEGER,
+            progress_message_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'running',
+            cursor INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            unreachable INTEGER NOT NULL DEFAULT 0,
+            finished_at TEXT
+        )
+        """
+    )
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_broadcasts_running ON broadcasts(id) WHERE status = 'running'")
+
+
+async def _v9_reactions(conn: aiosqlite.Connection) -> None:
+    # Оценки собеседников: одна на пару (оценивший, оценённый), чтобы репутация не менялась повторно и после перезапуска
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reactions (
+            rater_tg_id INTEGER NOT NULL,
+            partner_tg_id INTEGER NOT NULL,
+            reaction TEXT NOT NULL,
+            created_at TEXT DEFAULT (datetime('now')),
+            PRIMARY KEY (rater_tg_id, partner_tg_id)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+async def _v10_last_partner(conn: aiosqlite.Connection) -> None:
+    # С кем был последний диалог: оценить можно только его, а не любой tg_id из callback_data
+    await _add_columns(conn, "users", [("last_partner_tg_id", "INTEGER")])
+    await conn.execute("UPDATE users SET last_partner_tg_id = partner_tg_id WHERE partner_tg_id IS NOT NULL")
+
+
+MIGRATIONS: List[Tuple[int, Callable[[aiosqlite.Connection], Awaitable[None]]]] = [
+    (1, _v1_users),
+    (2, _v2_legacy_columns),
+    (3, _v3_user_indexes),
+    (4, _v4_user_counters),
+    (5, _v5_reputation),
+    (6, _v6_search_started_at),
+    (7, _v7_last_activity),
+    (8, _v8_broadcasts),
+    (9, _v9_reactions),
+    (10, _v10_last_partner),
+]
+
+
+async def migrate(conn: aiosqlite.Connection) -> int:
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            applied_at TEXT DEFAULT (datetime('now'))
+        )
+        """
+    )
+    await conn.commit()
+    cur = await conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    current = int((await cur.fetchone())[0])
+
+    # Каждая миграция — отдельная транзакция; уже применённые не выполняются повторно
+    for version, step in MIGRATIONS:
+        if version <= current:
+            continue
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            await step(conn)
+            await conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+        except BaseException:
+            await conn.rollback()
+            raise
+        await conn.commit()
+        current = version
+    return current
@@ -0,0 +1,81 @@
+import asyncio
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import ADMIN_IDS, REACTION_DIGEST_INTERVAL, REACTION_DIGEST_TOP
+from outbound import Outbox
+
+
+class AdminNotifier:
+    # Уведомления админам: данные о пользователе собираются один раз, затем сообщение уходит всем админам сразу —
+    # исходящая очередь отправляет в разные чаты параллельно. Реакции копятся и приходят сводкой раз в digest_interval
+    def __init__(self, outbox: Outbox, admin_ids: Sequence[int] = ADMIN_IDS, digest_interval: float = REACTION_DIGEST_INTERVAL, digest_top: int = REACTION_DIGEST_TOP) -> None:
+        self.outbox = outbox
+        self.admin_ids = list(admin_ids)
+        self.digest_interval = digest_interval
+        self.digest_top = digest_top
+        self.digests = 0
+        self._totals: Counter = Counter()
+        self._users: Dict[int, Tuple[Optional[str], Counter]] = {}
+        self._since = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.digest_interval > 0:
+            self._since = asyncio.get_running_loop().time()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Остаток сводки не теряем
+        self.flush()
+
+    def notify(self, text: str, reply_markup: Any = None) -> None:
+        for admin_id in self.admin_ids:
+            self.outbox.send_message(admin_id, text, reply_markup=reply_markup)
+
+    def reaction(self, tg_id: int, username: Optional[str], reaction_text: str) -> None:
+        if self._task is None:
+            self.notify(f"🎭 Новая реакция\n\n👤 Пользователь: {username or 'Аноним'} (ID: {tg_id})\n📊 Реакция: {reaction_text}")
+            return
+        self._totals[reaction_text] += 1
+        _, counts = self._users.get(tg_id, (None, Counter()))
+        counts[reaction_text] += 1
+        self._users[tg_id] = (username, counts)
+
+    def flush(self) -> None:
+        if not self._totals:
+            return
+        now = asyncio.get_running_loop().time()
+        text = self._format_digest(max(1, round((now - self._since) / 60)))
+        self._totals = Counter()
+        self._users = {}
+        self._since = now
+        self.digests += 1
+        self.notify(text)
+
+    def _format_digest(self, minutes: int) -> str:
+        lines: List[str] = [f"🎭 Реакции за {minutes} мин.\n"]
+        lines += [f"{reaction_text}: {count}" for reaction_text, count in self._totals.most_common()]
+        active = sorted(self._users.items(), key=lambda item: -sum(item[1][1].values()))
+        lines.append("\n👥 Самые активные:")
+        for tg_id, (username, counts) in active[:self.digest_top]:
+            summary = ", ".join(f"{reaction_text} ×{count}" for reaction_text, count in counts.most_common())
+            lines.append(f"👤 {username or 'Аноним'} (ID: {tg_id}): {summary}")
+        if len(active) > self.digest_top:
+            lines.append(f"…и ещё {len(active) - self.digest_top}")
+        return "\n".join(lines)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.digest_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Ошибка отправки сводки реакций: {e}")
@@ -0,0 +1,316 @@
+import asyncio
+import heapq
+import itertools
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import SendMessage, TelegramMethod
+
+from config import (
+    OUTBOX_GLOBAL_RATE, OUTBOX_GLOBAL_BURST, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST,
+    OUTBOX_MAX_RETRIES, OUTBOX_MAX_QUEUE,
+)
+
+# Меньше — важнее: пересылка сообщений собеседнику обгоняет уведомления, рассылка идёт последней
+PRIORITY_RELAY = 0
+PRIORITY_NOTIFY = 1
+PRIORITY_BROADCAST = 2
+PRIORITIES = (PRIORITY_RELAY, PRIORITY_NOTIFY, PRIORITY_BROADCAST)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class Outgoing:
+    __slots__ = ("method", "priority", "seq", "future", "attempts")
+
+    def __init__(self, method: TelegramMethod, priority: int, seq: int, future: Optional[asyncio.Future]) -> None:
+        self.method = method
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+        self.attempts = 0
+
+
+class ChatQueue:
+    # Очередь одного чата — строго FIFO, иначе сообщение собеседнику обгоняло бы уже поставленное «Собеседник найден».
+    # Приоритет выбирает, какой чат обслужить следующим: чат идёт с самым срочным из ожидающих в нём запросов.
+    # В полёте не больше одного запроса на чат
+    def __init__(self, bucket: TokenBucket) -> None:
+        self.bucket = bucket
+        self.queue: Deque[Outgoing] = deque()
+        self.counts = [0 for _ in PRIORITIES]
+        self.busy = False
+        self.blocked_until = 0.0
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    def priority(self) -> int:
+        return next(priority for priority, count in enumerate(self.counts) if count)
+
+    def head(self) -> Optional[Outgoing]:
+        return self.queue[0] if self.queue else None
+
+    def push(self, item: Outgoing, front: bool = False) -> None:
+        if front:
+            self.queue.appendleft(item)
+        else:
+            self.queue.append(item)
+        self.counts[item.priority] += 1
+
+    def pop(self) -> Outgoing:
+        if not self.queue:
+            raise IndexError("очередь чата пуста")
+        item = self.queue.popleft()
+        self.counts[item.priority] -= 1
+        return item
+
+
+class Outbox:
+    # Единая очередь исходящих запросов к Telegram. Общий и початовые token bucket'ы держат отправку в лимитах,
+    # ответ 429 откладывает чат на retry_after и возвращает запрос в начало его очереди.
+    # send() — отправить и забыть (ошибки только считаются), call() — дождаться результата.
+    # Через очередь идут пересылка, уведомления и рассылка; ответы хендлеров (answer, edit_text) отправляются напрямую
+    # и в общий лимит не входят — их по одному на апдейт пользователя
+    def __init__(
+        self,
+        bot: Bot,
+        global_rate: float = OUTBOX_GLOBAL_RATE,
+        global_burst: int = OUTBOX_GLOBAL_BURST,
+        chat_rate: float = OUTBOX_CHAT_RATE,
+        chat_burst: int = OUTBOX_CHAT_BURST,
+        max_retries: int = OUTBOX_MAX_RETRIES,
+        max_queue: int = OUTBOX_MAX_QUEUE,
+    ) -> None:
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_queue = max_queue
+        self.sent = 0
+        self.retries = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.depth = [0 for _ in PRIORITIES]
+        self._global: Optional[TokenBucket] = None
+        self._global_rate = global_rate
+        self._global_burst = global_burst
+        self._chats: Dict[int, ChatQueue] = {}
+        # Готовые к отправке чаты: (приоритет, порядковый номер головы, чат); устаревшие записи отбрасываются при извлечении
+        self._ready: List[Tuple[int, int, int]] = []
+        # Чаты, ждущие своего токена или retry_after: (когда, чат)
+        self._waiting: List[Tuple[float, int]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._in_flight: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._last_gc = 0.0
+        # Flood wait из 429 действует на весь бот, а не на один чат
+        self._blocked_until = 0.0
+
+    def __len__(self) -> int:
+        return sum(self.depth)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._global = TokenBucket(self._global_rate, self._global_burst, asyncio.get_running_loop().time())
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        # Даём очереди разойтись, остальное отменяем
+        if self._task is None:
+            return
+        deadline = asyncio.get_running_loop().time() + timeout
+        while (len(self) or self._in_flight) and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.05)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for task in list(self._in_flight):
+            task.cancel()
+        for chat in self._chats.values():
+            for item in chat.queue:
+                if item.future is not None and not item.future.done():
+                    item.future.cancel()
+        self._chats.clear()
+
+    def send(self, method: TelegramMethod, priority: int = PRIORITY_NOTIFY) -> None:
+        # Уведомления при переполненной очереди отбрасываются; пересылка собеседнику принимается всегда
+        if priority != PRIORITY_RELAY and len(self) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._enqueue(method, priority, None)
+
+    def call(self, method: TelegramMethod, priority: int = PRIORITY_RELAY) -> "asyncio.Future[Any]":
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(method, priority, future)
+        return future
+
+    def send_message(self, chat_id: int, text: str, reply_markup: Any = None, priority: int = PRIORITY_NOTIFY) -> None:
+        self.send(SendMessage(chat_id=chat_id, text=text, reply_markup=reply_markup), priority)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "relay": self.depth[PRIORITY_RELAY],
+            "notify": self.depth[PRIORITY_NOTIFY],
+            "broadcast": self.depth[PRIORITY_BROADCAST],
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def _enqueue(self, method: TelegramMethod, priority: int, future: Optional[asyncio.Future]) -> None:
+        chat_id = method.chat_id
+        now = asyncio.get_running_loop().time()
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = ChatQueue(TokenBucket(self.chat_rate, self.chat_burst, now))
+        item = Outgoing(method, priority, next(self._seq), future)
+        boosted = bool(len(chat)) and priority < chat.priority()
+        chat.push(item)
+        self.depth[priority] += 1
+        self.max_depth = max(self.max_depth, len(self))
+        # Срочный запрос за уже стоящими в чате поднимает весь чат; старая запись в куче отбросится при извлечении
+        if chat.head() is item or boosted:
+            self._schedule(chat_id, chat, now)
+        self._wakeup.set()
+
+    def _schedule(self, chat_id: int, chat: ChatQueue, now: float) -> None:
+        head = chat.head()
+        if chat.busy or head is None:
+            return
+        ready_at = max(chat.blocked_until, now + chat.bucket.wait_time(now))
+        if ready_at <= now:
+            heapq.heappush(self._ready, (chat.priority(), head.seq, chat_id))
+        else:
+            heapq.heappush(self._waiting, (ready_at, chat_id))
+
+    def _promote(self, now: float) -> None:
+        while self._waiting and self._waiting[0][0] <= now:
+            _, chat_id = heapq.heappop(self._waiting)
+            chat = self._chats.get(chat_id)
+            if chat is not None:
+                self._schedule(chat_id, chat, now)
+
+    def _peek(self) -> Optional[Tuple[int, ChatQueue]]:
+        while self._ready:
+            _, seq, chat_id = self._ready[0]
+            chat = self._chats.get(chat_id)
+            head = chat.head() if chat is not None else None
+            if head is not None and head.seq == seq and not chat.busy:
+                return chat_id, chat
+            heapq.heappop(self._ready)
+        return None
+
+    def _gc(self, now: float) -> None:
+        # Пустые чаты с полным ведром ничего не помнят — их можно забыть
+        for chat_id in [chat_id for chat_id, chat in self._chats.items() if not chat.busy and not len(chat) and chat.bucket.full(now) and chat.blocked_until <= now]:
+            del self._chats[chat_id]
+        self._last_gc = now
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if now - self._last_gc > 60:
+                self._gc(now)
+            self._promote(now)
+            ready = self._peek()
+            if ready is None:
+                self._wakeup.clear()
+                timeout = self._waiting[0][0] - now if self._waiting else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            delay = max(self._blocked_until - now, self._global.wait_time(now))
+            if delay > 0:
+                # После паузы выбор повторяется: за это время мог прийти более срочный запрос
+                await asyncio.sleep(delay)
+                continue
+            heapq.heappop(self._ready)
+            chat_id, chat = ready
+            item = chat.pop()
+            self.depth[item.priority] -= 1
+            if item.future is not None and item.future.cancelled():
+                # Тот, кто ждал результата, уже ушёл (например, остановленная рассылка) — не отправляем
+                self._schedule(chat_id, chat, now)
+                continue
+            self._global.take(now)
+            chat.bucket.take(now)
+            chat.busy = True
+            task = asyncio.create_task(self._deliver(chat_id, chat, item))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _deliver(self, chat_id: int, chat: ChatQueue, item: Outgoing) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            result = await self.bot(item.method)
+        except (TelegramRetryAfter, TelegramNetworkError, TelegramServerError) as e:
+            item.attempts += 1
+            if item.attempts > self.max_retries:
+                self.dropped += 1
+                self._resolve(item, error=e)
+            else:
+                self.retries += 1
+                pause = e.retry_after if isinstance(e, TelegramRetryAfter) else item.attempts
+                chat.blocked_until = loop.time() + pause
+                if isinstance(e, TelegramRetryAfter):
+                    self._blocked_until = max(self._blocked_until, chat.blocked_until)
+                chat.push(item, front=True)
+                self.depth[item.priority] += 1
+        except asyncio.CancelledError:
+            if item.future is not None:
+                item.future.cancel()
+            raise
+        except Exception as e:
+            self.failed += 1
+            self._resolve(item, error=e)
+        else:
+            self.sent += 1
+            self._resolve(item, result=result)
+        finally:
+            chat.busy = False
+            self._schedule(chat_id, chat, loop.time())
+            self._wakeup.set()
+
+    @staticmethod
+    def _resolve(item: Outgoing, result: Any = None, error: Optional[BaseException] = None) -> None:
+        if item.future is None or item.future.done():
+            return
+        if error is not None:
+            item.future.set_exception(error)
+        else:
+            item.future.set_result(result)
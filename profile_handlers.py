@@ -2,33 +2,33 @@ from aiogram import Router, F, Bot
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, Contact
+from typing import Optional
 
 from database import Database
 from keyboards import (
-    build_main_keyboard, build_profile_settings_keyboard
+    build_main_keyboard, build_profile_settings_keyboard, build_gender_keyboard, build_cancel_keyboard
 )
 from states import ProfileStates
-from config import ADMIN_IDS, DEVELOPER_ID
+from config import MAX_INTERESTS, MIN_AGE, MAX_AGE, GENDER_CHOICES, SEEKING_ANY
+from matchmaking import Matchmaker
+from middlewares import UserContext
 
 router = Router()
-db = Database()
 
-async def is_admin(user_id: int) -> bool:
-    if user_id == DEVELOPER_ID or user_id in ADMIN_IDS:
-        return True
-    user_info = await db.get_user(user_id)
-    return user_info and user_info.get('is_admin')
+GENDER_LABELS = {value: label for label, value in GENDER_CHOICES}
+
+def format_seeking(seeking_gender: Optional[str]) -> str:
+    return GENDER_LABELS.get(seeking_gender, "🤷 Неважно")
 
 @router.message(Command("start"))
-async def handle_start(message: Message, bot: Bot, state: FSMContext):
+async def handle_start(message: Message, bot: Bot, state: FSMContext, db: Database, user_ctx: UserContext):
     user = message.from_user
     if user is None:
         return
     
     await db.ensure_user(tg_id=user.id, username=user.username)
     
-    is_admin_user = await is_admin(user.id)
-    kb = build_main_keyboard(is_admin_user)
+    kb = build_main_keyboard(user_ctx.is_admin)
     
     await message.answer(
         "👋 Привет! Добро пожаловать в школьный чат!\n\n🔍 Нажми «Поиск» чтобы найти собеседника\n⚙️ «Настройки» чтобы посмотреть профиль",
@@ -44,31 +44,119 @@ async def handle_settings(message: Message, state: FSMContext, bot: Bot):
     await state.set_state(ProfileStates.settings)
 
 @router.message(ProfileStates.settings, F.text == "📄 Мой профиль")
-async def settings_show_profile(message: Message, state: FSMContext, bot: Bot):
-    await handle_profile_view(message, bot)
+async def settings_show_profile(message: Message, state: FSMContext, bot: Bot, db: Database, user_ctx: UserContext):
+    await handle_profile_view(message, bot, db, user_ctx)
+
+@router.message(ProfileStates.settings, F.text == "🎯 Интересы")
+async def settings_interests(message: Message, state: FSMContext, bot: Bot, db: Database):
+    await db.ensure_user(tg_id=message.from_user.id, username=message.from_user.username)
+    profile = await db.get_profile(message.from_user.id)
+    current = ", ".join(profile["interests"]) or "❌ Не указаны"
+    await message.answer(
+        f"🎯 Ваши интересы: {current}\n\n"
+        f"Напишите до {MAX_INTERESTS} интересов через запятую, например: музыка, игры, аниме\n"
+        "Чтобы очистить список, отправьте «-»\n\n"
+        "При поиске в первую очередь подбирается собеседник с общими интересами",
+        reply_markup=build_cancel_keyboard()
+    )
+    await state.set_state(ProfileStates.interests)
+
+@router.message(ProfileStates.settings, F.text == "🎂 Возраст")
+async def settings_age(message: Message, state: FSMContext, bot: Bot, db: Database):
+    await db.ensure_user(tg_id=message.from_user.id, username=message.from_user.username)
+    await message.answer(
+        f"🎂 Сколько вам лет? Напишите число от {MIN_AGE} до {MAX_AGE}\n\nСобеседники близкого возраста подбираются в первую очередь",
+        reply_markup=build_cancel_keyboard()
+    )
+    await state.set_state(ProfileStates.age)
+
+@router.message(ProfileStates.settings, F.text == "👤 Пол")
+async def settings_gender(message: Message, bot: Bot, db: Database):
+    await db.ensure_user(tg_id=message.from_user.id, username=message.from_user.username)
+    await message.answer("👤 Укажите ваш пол:", reply_markup=build_gender_keyboard("profile_gender"))
+
+@router.message(ProfileStates.settings, F.text == "💘 Кого ищу")
+async def settings_seeking(message: Message, bot: Bot, db: Database):
+    await db.ensure_user(tg_id=message.from_user.id, username=message.from_user.username)
+    await message.answer("💘 Кого вы хотите найти?", reply_markup=build_gender_keyboard("profile_seeking", with_any=True))
+
+@router.callback_query(F.data.startswith("profile_gender:"))
+async def callback_set_gender(callback: CallbackQuery, bot: Bot, db: Database, matchmaker: Matchmaker):
+    gender = callback.data.split(":", 1)[1]
+    if gender not in GENDER_LABELS:
+        await callback.answer()
+        return
+    await db.update_profile(callback.from_user.id, gender=gender)
+    await matchmaker.refresh(callback.from_user.id)
+    await callback.message.edit_text(f"✅ Пол сохранён: {GENDER_LABELS[gender]}")
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("profile_seeking:"))
+async def callback_set_seeking(callback: CallbackQuery, bot: Bot, db: Database, matchmaker: Matchmaker):
+    seeking_gender = callback.data.split(":", 1)[1]
+    if seeking_gender not in GENDER_LABELS and seeking_gender != SEEKING_ANY:
+        await callback.answer()
+        return
+    await db.update_profile(callback.from_user.id, seeking_gender=seeking_gender)
+    await matchmaker.refresh(callback.from_user.id)
+    await callback.message.edit_text(f"✅ Ищу: {format_seeking(seeking_gender)}")
+    await callback.answer()
 
+@router.message(ProfileStates.age, F.text == "🔙 В главное меню")
+@router.message(ProfileStates.interests, F.text == "🔙 В главное меню")
 @router.message(ProfileStates.settings, F.text == "🔙 В главное меню")
-async def settings_back_to_main(message: Message, state: FSMContext, bot: Bot):
-    is_admin_user = await is_admin(message.from_user.id)
-    await message.answer("🔙 Возвращаемся в главное меню", reply_markup=build_main_keyboard(is_admin_user))
+async def settings_back_to_main(message: Message, state: FSMContext, bot: Bot, user_ctx: UserContext):
+    await message.answer("🔙 Возвращаемся в главное меню", reply_markup=build_main_keyboard(user_ctx.is_admin))
     await state.clear()
 
+@router.message(ProfileStates.age, F.text == "❌ Отмена")
+@router.message(ProfileStates.interests, F.text == "❌ Отмена")
+async def settings_cancel_input(message: Message, state: FSMContext, bot: Bot):
+    await message.answer("↩️ Изменения не сохранены", reply_markup=build_profile_settings_keyboard())
+    await state.set_state(ProfileStates.settings)
+
+@router.message(ProfileStates.interests, F.text)
+async def settings_save_interests(message: Message, state: FSMContext, bot: Bot, db: Database, matchmaker: Matchmaker):
+    interests = [] if message.text.strip() == "-" else message.text.split(",")
+    await db.update_profile(message.from_user.id, interests=interests)
+    profile = await db.get_profile(message.from_user.id)
+    await matchmaker.refresh(message.from_user.id)
+    saved = ", ".join(profile["interests"]) or "❌ Не указаны"
+    await message.answer(f"✅ Интересы сохранены: {saved}", reply_markup=build_profile_settings_keyboard())
+    await state.set_state(ProfileStates.settings)
+
+@router.message(ProfileStates.age, F.text)
+async def settings_save_age(message: Message, state: FSMContext, bot: Bot, db: Database, matchmaker: Matchmaker):
+    text = message.text.strip()
+    if not text.isdigit() or not MIN_AGE <= int(text) <= MAX_AGE:
+        await message.answer(f"❌ Введите возраст числом от {MIN_AGE} до {MAX_AGE}")
+        return
+    await db.update_profile(message.from_user.id, age=int(text))
+    await matchmaker.refresh(message.from_user.id)
+    await message.answer(f"✅ Возраст сохранён: {text}", reply_markup=build_profile_settings_keyboard())
+    await state.set_state(ProfileStates.settings)
+
 @router.message(F.text == "📄 Профиль")
-async def handle_profile_view(message: Message, bot: Bot):
+async def handle_profile_view(message: Message, bot: Bot, db: Database, user_ctx: UserContext):
     info = await db.get_user(message.from_user.id)
     if not info:
         await message.answer("❌ Профиль не найден")
         return
     
     username = f"@{info['username']}" if info['username'] else "❌ Не указан"
+    profile = await db.get_profile(message.from_user.id)
+    interests = ", ".join(profile["interests"]) or "❌ Не указаны"
     
     text = (
         "📊 Ваш профиль\n\n"
         f"🆔 ID: {info['tg_id']}\n"
         f"👤 Username: {username}\n"
+        f"👤 Пол: {GENDER_LABELS.get(profile['gender'], '❌ Не указан')}\n"
+        f"💘 Ищу: {format_seeking(profile['seeking_gender'])}\n"
+        f"🎂 Возраст: {profile['age'] or '❌ Не указан'}\n"
+        f"🎯 Интересы: {interests}\n"
         f"📅 Регистрация: {info['registered_at'][:16]}\n"
         f"👑 Статус: {'⭐ Администратор' if info['is_admin'] else '👤 Пользователь'}\n\n"
         "⚙️ Чтобы изменить настройки, нажмите «Настройки»"
     )
-    is_admin_user = await is_admin(message.from_user.id)
-    await message.answer(text, reply_markup=build_main_keyboard(is_admin_user))
\ No newline at end of file
+    await message.answer(text, reply_markup=build_main_keyboard(user_ctx.is_admin))
\ No newline at end of file
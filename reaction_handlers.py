@@ -8,78 +8,78 @@ from aiogram.types import Message, CallbackQuery
 
 from database import Database
 
+from matchmaking import Matchmaker
+
 from keyboards import build_main_keyboard
 
-from config import ADMIN_IDS, DEVELOPER_ID
+from middlewares import UserContext
+
+from notifications import AdminNotifier
 
 
 
 router = Router()
 
-db = Database()
 
 
+# Изменение репутации оценённого собеседника; другие значения из callback_data не принимаются
 
-async def is_admin(user_id: int) -> bool:
+REACTION_DELTAS = {"like": 1, "dislike": -1}
 
-    if user_id == DEVELOPER_ID or user_id in ADMIN_IDS:
 
-        return True
 
-    user_info = await db.get_user(user_id)
+@router.callback_query(F.data.startswith("react:"))
 
-    return user_info and user_info.get('is_admin')
+async def handle_reaction(call: CallbackQuery, state: FSMContext, bot: Bot, db: Database, matchmaker: Matchmaker, admin_notifier: AdminNotifier, user_ctx: UserContext) -> None:
 
+    user_id = call.from_user.id
 
+    parts = call.data.split(":")
 
-@router.callback_query(F.data.startswith("react:"))
+    reaction_type = parts[1]
 
-async def handle_reaction(call: CallbackQuery, state: FSMContext, bot: Bot) -> None:
+    if reaction_type not in REACTION_DELTAS:
 
-    user_id = call.from_user.id
+        await call.answer()
 
-    reaction_type = call.data.split(":")[1]
+        return
 
     
 
-    if reaction_type == "like":
+    # Оценка засчитывается в репутацию собеседника один раз за пару; кнопки без id собеседника — из старых сообщений
 
-        reaction_text = "👍 Лайк"
+    if len(parts) > 2 and parts[2].lstrip("-").isdigit():
 
-    else:
+        partner_id = int(parts[2])
 
-        reaction_text = "👎 Дизлайк"
+        if partner_id != user_id and await db.add_reaction(user_id, partner_id, reaction_type, REACTION_DELTAS[reaction_type]):
 
-    
-
-    await call.message.edit_text(f"✅ Спасибо за оценку: {reaction_text}")
+            await matchmaker.refresh(partner_id)
 
     
 
-    # Уведомляем админов о реакции
+    if reaction_type == "like":
 
-    for admin_id in ADMIN_IDS:
+        reaction_text = "👍 Лайк"
 
-        try:
+    else:
 
-            user_info = await db.get_user(user_id)
+        reaction_text = "👎 Дизлайк"
 
-            await bot.send_message(
+    
 
-                admin_id,
+    await call.message.edit_text(f"✅ Спасибо за оценку: {reaction_text}")
 
-                f"🎭 Новая реакция\n\n👤 Пользователь: {user_info['username'] or 'Аноним'} (ID: {user_id})\n📊 Реакция: {reaction_text}",
+    
 
-            )
+    # Уведомляем админов о реакции: имя берётся один раз из кэша состояний, при включённой сводке реакция копится в ней
 
-        except Exception:
+    user_state = await db.get_user_state(user_id)
 
-            pass
+    admin_notifier.reaction(user_id, user_state.username if user_state else call.from_user.username, reaction_text)
 
     
 
     # Возвращаем главное меню
 
-    is_admin_user = await is_admin(user_id)
-
-    await call.message.answer("Выберите действие:", reply_markup=build_main_keyboard(is_admin_user))
\ No newline at end of file
+    await call.message.answer("Выберите действие:", reply_markup=build_main_keyboard(user_ctx.is_admin))
\ No newline at end of file
@@ -0,0 +1,70 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from aiogram.types import InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo, Message
+
+from config import RELAY_ALBUM_WINDOW_MS
+
+# Больше в один альбом Telegram не принимает
+ALBUM_LIMIT = 10
+
+InputMedia = Union[InputMediaAudio, InputMediaDocument, InputMediaPhoto, InputMediaVideo]
+AlbumFlush = Callable[[List[Message]], Awaitable[None]]
+
+
+def album_media(message: Message) -> Optional[InputMedia]:
+    # Элемент альбома по уже загруженному file_id; подпись и её разметка сохраняются
+    caption = {"caption": message.caption, "caption_entities": message.caption_entities}
+    if message.photo:
+        return InputMediaPhoto(media=message.photo[-1].file_id, has_spoiler=message.has_media_spoiler, **caption)
+    if message.video:
+        return InputMediaVideo(media=message.video.file_id, has_spoiler=message.has_media_spoiler, **caption)
+    if message.document:
+        return InputMediaDocument(media=message.document.file_id, **caption)
+    if message.audio:
+        return InputMediaAudio(media=message.audio.file_id, **caption)
+    return None
+
+
+class AlbumBuffer:
+    # Копит части альбома по (чат, media_group_id); через window после последней части отдаёт их в flush
+    # одним списком в исходном порядке. Собранный до лимита альбом отправляется сразу
+    def __init__(self, window_ms: int = RELAY_ALBUM_WINDOW_MS) -> None:
+        self.window = window_ms / 1000
+        self.albums = 0
+        self._pending: Dict[Tuple[int, str], Tuple[List[Message], AlbumFlush]] = {}
+        self._timers: Dict[Tuple[int, str], asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, message: Message, flush: AlbumFlush) -> None:
+        # flush берётся от первой части: собеседник и клавиатура фиксируются на момент начала альбома
+        key = (message.chat.id, message.media_group_id)
+        messages, _ = self._pending.setdefault(key, ([], flush))
+        messages.append(message)
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if len(messages) >= ALBUM_LIMIT:
+            self._fire(key)
+        else:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.window, self._fire, key)
+
+    def _fire(self, key: Tuple[int, str]) -> None:
+        self._timers.pop(key, None)
+        messages, flush = self._pending.pop(key)
+        messages.sort(key=lambda m: m.message_id)
+        self.albums += 1
+        task = asyncio.create_task(flush(messages))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self) -> None:
+        # При остановке бота отправляем всё накопленное, не дожидаясь окна
+        for key in list(self._pending):
+            self._timers[key].cancel()
+            self._fire(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,181 @@
+import numpy as np
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Optional, Set, Tuple
+
+# Интересы кодируются битовой маской из MASK_WORDS 64-битных слов: бит получают первые MASK_BITS интересов словаря
+# (при популярности по Ципфу это почти всегда самые частые). Остальные в маску не попадают, и пересечение по ним
+# досчитывается точно по спискам слотов пула (см. CandidatePool)
+MASK_WORDS = 4
+MASK_BITS = MASK_WORDS * 64
+# Репутация (лайки минус дизлайки) приводится к [-1, 1] делением на эту величину
+REPUTATION_SCALE = 10.0
+
+
+class ScoringWeights(NamedTuple):
+    interests: float = 1.0
+    age: float = 0.2
+    reputation: float = 0.5
+    wait: float = 0.01
+
+
+class Features(NamedTuple):
+    age: float
+    mask: np.ndarray
+    reputation: float
+    # Интересы без собственного бита в маске
+    overflow: FrozenSet[str] = frozenset()
+
+
+class InterestVocabulary:
+    # Интернирование интересов: строка получает постоянный целый id при первом появлении
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def encode(self, interests: Iterable[str]) -> Tuple[np.ndarray, FrozenSet[str]]:
+        mask = np.zeros(MASK_WORDS, dtype=np.uint64)
+        overflow = []
+        for interest in interests:
+            bit = self._ids.setdefault(interest, len(self._ids))
+            if bit < MASK_BITS:
+                mask[bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+            else:
+                overflow.append(interest)
+        return mask, frozenset(overflow)
+
+    def features(self, age: Optional[int], interests: Iterable[str], reputation: int) -> Features:
+        mask, overflow = self.encode(frozenset(interests))
+        return Features(
+            float(age) if age else np.nan,
+            mask,
+            max(-1.0, min(1.0, reputation / REPUTATION_SCALE)),
+            overflow,
+        )
+
+
+class CandidatePool:
+    # Признаки ожидающих лежат в плотных массивах: удаление переносит последний элемент на место удалённого,
+    # поэтому оценка всего пула — несколько векторных операций по срезу [:size].
+    # Для интересов без бита в маске хранятся списки слотов, в которых они есть
+    def __init__(self, capacity: int = 256) -> None:
+        self.size = 0
+        self._slots: Dict[int, int] = {}
+        self._overflow: Dict[int, FrozenSet[str]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.age = np.zeros(capacity, dtype=np.float32)
+        self.masks = np.zeros((capacity, MASK_WORDS), dtype=np.uint64)
+        self.reputation = np.zeros(capacity, dtype=np.float32)
+        self.since = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, tg_id: int) -> bool:
+        return tg_id in self._slots
+
+    def _grow(self) -> None:
+        capacity = len(self.ids) * 2
+        self.ids = np.resize(self.ids, capacity)
+        self.age = np.resize(self.age, capacity)
+        self.masks = np.resize(self.masks, (capacity, MASK_WORDS))
+        self.reputation = np.resize(self.reputation, capacity)
+        self.since = np.resize(self.since, capacity)
+
+    def add(self, tg_id: int, features: Features, since: float) -> None:
+        slot = self._slots.get(tg_id)
+        if slot is None:
+            if self.size == len(self.ids):
+                self._grow()
+            slot = self.size
+            self.size += 1
+            self._slots[tg_id] = slot
+            self.ids[slot] = tg_id
+        else:
+            self._unpost(tg_id, slot)
+        self.age[slot] = features.age
+        self.masks[slot] = features.mask
+        self.reputation[slot] = features.reputation
+        self.since[slot] = since
+        if features.overflow:
+            self._overflow[tg_id] = features.overflow
+            for interest in features.overflow:
+                self._postings.setdefault(interest, set()).add(slot)
+
+    def _unpost(self, tg_id: int, slot: int) -> None:
+        for interest in self._overflow.pop(tg_id, ()):
+            slots = self._postings[interest]
+            slots.discard(slot)
+            if not slots:
+                del self._postings[interest]
+
+    def discard(self, tg_id: int) -> None:
+        slot = self._slots.pop(tg_id, None)
+        if slot is None:
+            return
+        self._unpost(tg_id, slot)
+        last = self.size - 1
+        if slot != last:
+            moved = int(self.ids[last])
+            for interest in self._overflow.get(moved, ()):
+                slots = self._postings[interest]
+                slots.discard(last)
+                slots.add(slot)
+            self.ids[slot] = moved
+            self.age[slot] = self.age[last]
+            self.masks[slot] = self.masks[last]
+            self.reputation[slot] = self.reputation[last]
+            self.since[slot] = self.since[last]
+            self._slots[moved] = slot
+        self.size = last
+
+    def clear(self) -> None:
+        self._slots.clear()
+        self._overflow.clear()
+        self._postings.clear()
+        self.size = 0
+
+    def oldest(self) -> Optional[float]:
+        return float(self.since[:self.size].min()) if self.size else None
+
+    def score(self, features: Features, weights: ScoringWeights, now: float) -> np.ndarray:
+        n = self.size
+        shared = np.bitwise_count(self.masks[:n] & features.mask).sum(axis=1, dtype=np.float32)
+        score = weights.interests * shared
+        if features.overflow:
+            self._add_overflow(score, features, weights)
+        score += weights.reputation * self.reputation[:n]
+        score += weights.wait * (now - self.since[:n]).astype(np.float32)
+        if not np.isnan(features.age):
+            # Неизвестный возраст кандидата не штрафуется
+            score -= weights.age * np.nan_to_num(np.abs(self.age[:n] - features.age), nan=0.0)
+        return score
+
+    def best(self, tg_id: int, features: Features, weights: ScoringWeights, now: float, exclude: Iterable[int] = (), max_wait: Optional[float] = None) -> Optional[Tuple[int, float, float]]:
+        # Возвращает (кандидат, оценка, начало ожидания). Если кто-то ждёт дольше max_wait,
+        # выбирается самый давно ждущий из них, иначе — лучший по оценке
+        if not self.size:
+            return None
+        score = self.score(features, weights, now)
+        for excluded in (tg_id, *exclude):
+            slot = self._slots.get(excluded)
+            if slot is not None:
+                score[slot] = -np.inf
+        since = self.since[:self.size]
+        slot = int(score.argmax())
+        if score[slot] == -np.inf:
+            return None
+        if max_wait is not None:
+            overdue = np.where((since <= now - max_wait) & (score != -np.inf), since, np.inf)
+            oldest = int(overdue.argmin())
+            if overdue[oldest] != np.inf:
+                slot = oldest
+        return int(self.ids[slot]), float(score[slot]), float(since[slot])
+
+    def _add_overflow(self, score: np.ndarray, features: Features, weights: ScoringWeights) -> None:
+        # Маска учла только интересы с битом; остальные — хвост словаря, их списки слотов короткие
+        for interest in features.overflow:
+            slots = self._postings.get(interest)
+            if slots:
+                score[np.fromiter(slots, dtype=np.intp, count=len(slots))] += weights.interests
@@ -2,10 +2,13 @@ from aiogram.fsm.state import StatesGroup, State
 
 class ProfileStates(StatesGroup):
     settings = State()
+    interests = State()
+    age = State()
 
 class AdminStates(StatesGroup):
     main = State()
     user_management = State()
+    broadcast = State()
 
 class ReportStates(StatesGroup):
     waiting_reason = State()
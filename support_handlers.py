@@ -8,10 +8,12 @@ from database import Database
 
 from keyboards import build_main_keyboard
 
-from config import ADMIN_IDS
-
 from states import SupportStates
 
+from middlewares import UserContext
+
+from notifications import AdminNotifier
+
 from datetime import datetime
 
 import asyncio
@@ -20,8 +22,6 @@ import asyncio
 
 router = Router()
 
-db = Database()
-
 
 
 support_tickets = {}
@@ -98,9 +98,23 @@ async def support_contact_callback(call: CallbackQuery, state: FSMContext):
 
 
 
+@router.callback_query(F.data == "support_close")
+
+async def support_close_callback(call: CallbackQuery, state: FSMContext):
+
+    await state.clear()
+
+    await call.message.delete()
+
+    await call.answer()
+
+
+
+
+
 @router.message(SupportStates.waiting_message)
 
-async def handle_support_message(message: Message, state: FSMContext, bot: Bot):
+async def handle_support_message(message: Message, state: FSMContext, bot: Bot, db: Database, admin_notifier: AdminNotifier, user_ctx: UserContext):
 
     user = message.from_user
 
@@ -128,23 +142,13 @@ async def handle_support_message(message: Message, state: FSMContext, bot: Bot):
 
     
 
-    for admin_id in ADMIN_IDS:
-
-        try:
-
-            await bot.send_message(
-
-                admin_id,
-
-                f"🆕 НОВОЕ ОБРАЩЕНИЕ В ПОДДЕРЖКУ\n\n🎫 ID тикета: {ticket_id}\n👤 Пользователь: {user_info['username'] or 'Аноним'} (ID: {user.id})\n📅 Время: {support_tickets[ticket_id]['timestamp']}\n📝 Сообщение: {message.text}\n\n💬 Для ответа используйте админ-панель → Поддержка",
-
-                reply_markup=build_admin_support_keyboard(ticket_id)
+    admin_notifier.notify(
 
-            )
+        f"🆕 НОВОЕ ОБРАЩЕНИЕ В ПОДДЕРЖКУ\n\n🎫 ID тикета: {ticket_id}\n👤 Пользователь: {support_tickets[ticket_id]['username'] or 'Аноним'} (ID: {user.id})\n📅 Время: {support_tickets[ticket_id]['timestamp']}\n📝 Сообщение: {message.text}\n\n💬 Для ответа используйте админ-панель → Поддержка",
 
-        except Exception:
+        reply_markup=build_admin_support_keyboard(ticket_id)
 
-            pass
+    )
 
     
 
@@ -152,34 +156,8 @@ async def handle_support_message(message: Message, state: FSMContext, bot: Bot):
 
         "✅ Ваше сообщение отправлено в поддержку!\n\nМы ответим вам в ближайшее время. Спасибо за обращение!",
 
-        reply_markup=build_main_keyboard()
+        reply_markup=build_main_keyboard(user_ctx.is_admin)
 
     )
 
     await state.clear()
-
-
-
-@router.message(F.text == "🛠️ Админ")
-
-async def handle_admin_main(message: Message, state: FSMContext):
-
-    user = message.from_user
-
-    if user is None or user.id not in ADMIN_IDS:
-
-        await message.answer("❌ Недостаточно прав")
-
-        return
-
-    
-
-    from admin_handlers import build_admin_keyboard
-
-    await message.answer(
-
-        "🛠️ Админ-панель\n\nВыберите раздел:",
-
-        reply_markup=build_admin_keyboard(),
-
-    )
\ No newline at end of file
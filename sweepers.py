@@ -0,0 +1,118 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+from config import SEARCH_TIMEOUT_NOTIFY, SWEEP_TICK, IDLE_NOTIFY_BATCH
+from chat_handlers import end_dialog_and_notify
+from database import Database
+from keyboards import build_main_keyboard, build_reactions_keyboard
+from matchmaking import Matchmaker
+from middlewares import is_admin
+from outbound import Outbox
+
+
+class SearchSweeper:
+    # Фоновая задача: раз в тик подбирает пары давно ждущим, продвигает колесо сроков матчмейкера и снимает зависшие поиски
+    def __init__(self, outbox: Outbox, db: Database, matchmaker: Matchmaker, tick: float = SWEEP_TICK, notify: bool = SEARCH_TIMEOUT_NOTIFY) -> None:
+        self.outbox = outbox
+        self.db = db
+        self.matchmaker = matchmaker
+        self.tick = tick
+        self.notify = notify
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                for pair in await self.matchmaker.rematch():
+                    await self._notify_matched(pair)
+            except Exception as e:
+                print(f"❌ Ошибка повторного подбора: {e}")
+            try:
+                expired = await self.matchmaker.expire()
+                if expired and self.notify:
+                    await self._notify(expired)
+            except Exception as e:
+                print(f"❌ Ошибка снятия просроченных поисков: {e}")
+
+    async def _notify_matched(self, pair: Tuple[int, int]) -> None:
+        for tg_id in pair:
+            self.outbox.send_message(
+                tg_id,
+                "✅ Собеседник найден!\n\n💬 Можете начинать общение!",
+                reply_markup=build_main_keyboard(await is_admin(self.db, tg_id)),
+            )
+
+    async def _notify(self, tg_ids: List[int]) -> None:
+        minutes = max(1, round(self.matchmaker.search_timeout / 60))
+        for tg_id in tg_ids:
+            self.outbox.send_message(
+                tg_id,
+                f"⌛ Поиск остановлен: за {minutes} мин. собеседник не нашёлся\n\nНажмите «🔎 Поиск», чтобы попробовать снова",
+                reply_markup=build_main_keyboard(await is_admin(self.db, tg_id)),
+            )
+
+
+class IdleDialogSweeper:
+    # Фоновая задача: завершает диалоги без сообщений дольше таймаута тем же путём, что и «🛑 Стоп».
+    # Диалоги обрабатываются пачками по batch_size с паузой в тик, чтобы не упереться в лимиты Telegram
+    def __init__(self, outbox: Outbox, db: Database, tick: float = SWEEP_TICK, batch_size: int = IDLE_NOTIFY_BATCH) -> None:
+        self.outbox = outbox
+        self.db = db
+        self.tick = tick
+        self.batch_size = max(1, batch_size)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.db.activity.timeout > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                idle = self.db.idle_dialogs()
+                for start in range(0, len(idle), self.batch_size):
+                    if start:
+                        await asyncio.sleep(self.tick)
+                    await asyncio.gather(*(self._end(a, b) for a, b in idle[start:start + self.batch_size]))
+            except Exception as e:
+                print(f"❌ Ошибка завершения простаивающих диалогов: {e}")
+
+    async def _end(self, a: int, b: int) -> None:
+        # Пока ждала своя пачка, диалог мог закончиться или смениться
+        if self.db.partners.get(a) != b:
+            return
+        minutes = max(1, round(self.db.activity.timeout / 60))
+        notice = f"💤 Диалог завершён: в нём не было сообщений {minutes} мин."
+        if await end_dialog_and_notify(self.outbox, self.db, a, notice=notice) is None:
+            return
+        self.db.activity.ended += 1
+        self.outbox.send_message(a, notice, reply_markup=build_main_keyboard(await is_admin(self.db, a)))
+        self.outbox.send_message(
+            a,
+            "💭 Если хотите, оставьте мнение о вашем собеседнике. Это поможет находить вам подходящих собеседников:",
+            reply_markup=build_reactions_keyboard(b),
+        )
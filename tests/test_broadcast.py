@@ -0,0 +1,102 @@
+import asyncio
+from typing import List
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import CopyMessage, SendMessage, TelegramMethod
+from aiogram.types import Message, Update
+
+from broadcast import Broadcaster
+from config import DEVELOPER_ID
+from database import Database
+from matchmaking import Matchmaker
+from middlewares import UserContextMiddleware
+from notifications import AdminNotifier
+from outbound import Outbox
+from relay import AlbumBuffer
+import admin_handlers
+import chat_handlers
+import profile_handlers
+import reaction_handlers
+
+
+class RecordingSession(BaseSession):
+    # Вместо Telegram: запоминает запросы, на отправку сообщения отвечает готовым Message
+    def __init__(self) -> None:
+        super().__init__()
+        self.requests: List[TelegramMethod] = []
+        self._message_id = 1000
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+        if isinstance(method, SendMessage):
+            self._message_id += 1
+            return Message.model_validate({
+                "message_id": self._message_id, "date": 0, "text": method.text,
+                "chat": {"id": method.chat_id, "type": "private"},
+            }).as_(bot)
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def message_update(update_id: int, tg_id: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "chat": {"id": tg_id, "type": "private"},
+            "from": {"id": tg_id, "is_bot": False, "first_name": "test"},
+        },
+    })
+
+
+def test_admin_message_in_broadcast_state_launches_broadcast(tmp_path):
+    async def scenario() -> None:
+        db = Database(str(tmp_path / "bot.db"))
+        await db.init()
+        for tg_id in (DEVELOPER_ID, 2, 3):
+            await db.ensure_user(tg_id, f"user{tg_id}")
+        session = RecordingSession()
+        bot = Bot("123:abc", session=session)
+        matchmaker = Matchmaker(db)
+        outbox = Outbox(bot)
+        broadcaster = Broadcaster(outbox, db)
+        dp = Dispatcher(
+            db=db, matchmaker=matchmaker, outbox=outbox, broadcaster=broadcaster,
+            admin_notifier=AdminNotifier(outbox, admin_ids=[]), albums=AlbumBuffer(),
+        )
+        user_context = UserContextMiddleware(db, matchmaker)
+        dp.message.outer_middleware(user_context)
+        dp.callback_query.outer_middleware(user_context)
+        # Порядок роутеров как в main.py: пересылка собеседнику стоит раньше админки
+        for router in (profile_handlers.router, chat_handlers.router, admin_handlers.router, reaction_handlers.router):
+            dp.include_router(router)
+        outbox.start()
+        try:
+            await dp.feed_update(bot, message_update(1, DEVELOPER_ID, "🛠️ Админ"))
+            await dp.feed_update(bot, message_update(2, DEVELOPER_ID, "📣 Рассылка"))
+            await dp.feed_update(bot, message_update(3, DEVELOPER_ID, "Всем привет!"))
+            for _ in range(100):
+                if not broadcaster.running:
+                    break
+                await asyncio.sleep(0.05)
+            assert not any(
+                isinstance(method, SendMessage) and "нет активного собеседника" in method.text
+                for method in session.requests
+            )
+            copies = {method.chat_id for method in session.requests if isinstance(method, CopyMessage)}
+            assert copies == {DEVELOPER_ID, 2, 3}
+            async with db.reader() as conn:
+                cur = await conn.execute("SELECT status, sent FROM broadcasts")
+                assert await cur.fetchall() == [("done", 3)]
+        finally:
+            await broadcaster.stop()
+            await outbox.stop()
+            await db.close()
+
+    asyncio.run(scenario())
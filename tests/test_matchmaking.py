@@ -0,0 +1,93 @@
+import asyncio
+
+from database import Database
+from matchmaking import Matchmaker, RecentPartners
+
+
+async def open_db(path) -> Database:
+    db = Database(str(path))
+    await db.init()
+    for tg_id in (1, 2):
+        await db.ensure_user(tg_id, f"user{tg_id}")
+    return db
+
+
+def test_strict_queue_does_not_rematch_recent_partners(tmp_path):
+    # MATCH_MAX_WAIT=0 (строгая очередь) не должен сразу сводить тех, кто только что разошёлся
+    async def scenario() -> None:
+        db = await open_db(tmp_path / "bot.db")
+        try:
+            matchmaker = Matchmaker(db, max_wait=0)
+            matchmaker.recent.fallback = 60
+            await matchmaker.load()
+            matchmaker.recent.record(1, 2)
+            assert await matchmaker.search(1) is None
+            assert await matchmaker.search(2) is None
+            assert await matchmaker.rematch() == []
+            assert len(matchmaker) == 2
+        finally:
+            await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_recent_partners_matched_after_fallback(tmp_path):
+    async def scenario() -> None:
+        db = await open_db(tmp_path / "bot.db")
+        try:
+            matchmaker = Matchmaker(db, max_wait=0)
+            matchmaker.recent.fallback = 0.1
+            await matchmaker.load()
+            matchmaker.recent.record(1, 2)
+            assert await matchmaker.search(1) is None
+            assert await matchmaker.search(2) is None
+            await asyncio.sleep(0.15)
+            assert await matchmaker.rematch() == [(1, 2)]
+            assert db.partners.get(1) == 2
+            assert len(matchmaker) == 0
+        finally:
+            await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_fallback_disabled_keeps_recent_partners_apart(tmp_path):
+    async def scenario() -> None:
+        db = await open_db(tmp_path / "bot.db")
+        try:
+            matchmaker = Matchmaker(db, max_wait=0)
+            matchmaker.recent.fallback = 0
+            await matchmaker.load()
+            matchmaker.recent.record(1, 2)
+            await matchmaker.search(1)
+            await asyncio.sleep(0.05)
+            assert await matchmaker.search(2) is None
+            assert await matchmaker.rematch() == []
+        finally:
+            await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_failed_pair_keeps_requester_wait_time(tmp_path):
+    async def scenario() -> None:
+        db = await open_db(tmp_path / "bot.db")
+        try:
+            await db.ensure_user(3, "user3")
+            matchmaker = Matchmaker(db, max_wait=None)
+            matchmaker.recent.fallback = 0
+            await matchmaker.load()
+            # 1 и 2 — недавние собеседники, поэтому оба ждут
+            matchmaker.recent.record(1, 2)
+            assert await matchmaker.search(1) is None
+            assert await matchmaker.search(2) is None
+            since = matchmaker._waiting[1].since
+            # 2 уже в диалоге в базе, но всё ещё в очереди: пара 1–2 не запишется, и 1 вернётся в очередь
+            matchmaker.recent = RecentPartners(fallback=0)
+            await db.force_pair(2, 3)
+            assert await matchmaker.search(1) is None
+            assert matchmaker._waiting[1].since == since
+        finally:
+            await db.close()
+
+    asyncio.run(scenario())
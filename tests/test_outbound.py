@@ -0,0 +1,41 @@
+import asyncio
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from outbound import Outbox
+
+
+class FloodBot:
+    # Первый запрос получает 429 с retry_after, остальные проходят; запоминается время каждой отправки
+    def __init__(self, retry_after: int) -> None:
+        self.retry_after = retry_after
+        self.flooded = False
+        self.sent = []
+
+    async def __call__(self, method: SendMessage):
+        loop = asyncio.get_running_loop()
+        if not self.flooded:
+            self.flooded = True
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=self.retry_after)
+        self.sent.append((method.chat_id, loop.time()))
+        return True
+
+
+def test_retry_after_pauses_every_chat():
+    async def scenario() -> None:
+        bot = FloodBot(retry_after=1)
+        outbox = Outbox(bot, global_rate=1000, global_burst=100, chat_rate=1000, chat_burst=10)
+        outbox.start()
+        started = asyncio.get_running_loop().time()
+        outbox.send_message(1, "first")
+        await asyncio.sleep(0.05)
+        for chat_id in (2, 3):
+            outbox.send_message(chat_id, "next")
+        await outbox.stop(timeout=3)
+        assert sorted(chat_id for chat_id, _ in bot.sent) == [1, 2, 3]
+        # Пока действует flood wait, не уходит ничего — ни в тот же чат, ни в другие
+        assert all(at - started >= 1 for _, at in bot.sent)
+        assert outbox.stats()["retries"] == 1
+
+    asyncio.run(scenario())
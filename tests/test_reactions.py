@@ -0,0 +1,30 @@
+import asyncio
+
+from database import Database
+
+
+async def open_db(path) -> Database:
+    db = Database(str(path))
+    await db.init()
+    for tg_id in (1, 2, 3):
+        await db.ensure_user(tg_id, f"user{tg_id}")
+    return db
+
+
+def test_reaction_requires_real_partner(tmp_path):
+    # Поддельный callback с чужим tg_id не должен менять репутацию
+    async def scenario() -> None:
+        db = await open_db(tmp_path / "bot.db")
+        try:
+            assert not await db.add_reaction(1, 3, "dislike", -1)
+            assert await db.pair_users(1, 2)
+            assert not await db.add_reaction(1, 3, "dislike", -1)
+            await db.end_dialog_for(1)
+            assert await db.add_reaction(1, 2, "like", 1)
+            assert not await db.add_reaction(1, 2, "like", 1)
+            assert (await db.get_user_state(2)).reputation == 1
+            assert (await db.get_user_state(3)).reputation == 0
+        finally:
+            await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+import math
+import time
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+
+class TimingWheel:
+    # Иерархическое колесо таймеров: levels уровней по slots ячеек, ячейка уровня k покрывает tick * slots**k секунд.
+    # Постановка и отмена — O(1), продвижение на тик разбирает одну ячейку; при переходе границы верхнего уровня
+    # его ячейка раскладывается по нижним. Ключ в колесе один: повторная постановка переносит срок
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 4, now: Optional[float] = None) -> None:
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self._wheels: List[List[Set[Hashable]]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        self._deadlines: Dict[Hashable, int] = {}
+        self._where: Dict[Hashable, Tuple[int, int]] = {}
+        self._due: Set[Hashable] = set()
+        self._current = int((time.monotonic() if now is None else now) // tick)
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def _place(self, key: Hashable) -> None:
+        deadline = self._deadlines[key]
+        delta = deadline - self._current
+        if delta <= 0:
+            self._due.add(key)
+            return
+        # Сроки дальше горизонта колеса кладутся в последнюю ячейку и перераскладываются при её разборе
+        target = min(deadline, self._current + self.slots ** self.levels - 1)
+        level = 0
+        while level < self.levels - 1 and target - self._current >= self.slots ** (level + 1):
+            level += 1
+        slot = (target // self.slots ** level) % self.slots
+        self._wheels[level][slot].add(key)
+        self._where[key] = (level, slot)
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        self.cancel(key)
+        self._deadlines[key] = math.ceil(deadline / self.tick)
+        self._place(key)
+
+    def cancel(self, key: Hashable) -> None:
+        if self._deadlines.pop(key, None) is None:
+            return
+        where = self._where.pop(key, None)
+        if where is None:
+            self._due.discard(key)
+        else:
+            self._wheels[where[0]][where[1]].discard(key)
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        target = int((time.monotonic() if now is None else now) // self.tick)
+        expired = list(self._due)
+        self._due.clear()
+        while self._current < target:
+            self._current += 1
+            for level in range(1, self.levels):
+                if self._current % self.slots ** level:
+                    break
+                self._cascade(level, (self._current // self.slots ** level) % self.slots)
+            slot = self._current % self.slots
+            bucket, self._wheels[0][slot] = self._wheels[0][slot], set()
+            for key in bucket:
+                del self._where[key]
+                if self._deadlines[key] <= self._current:
+                    expired.append(key)
+                else:
+                    self._place(key)
+            expired.extend(self._due)
+            self._due.clear()
+        for key in expired:
+            del self._deadlines[key]
+        return expired
+
+    def _cascade(self, level: int, slot: int) -> None:
+        bucket, self._wheels[level][slot] = self._wheels[level][slot], set()
+        for key in bucket:
+            del self._where[key]
+            self._place(key)